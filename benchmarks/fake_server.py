@@ -0,0 +1,489 @@
+"""
+本機的 Notion / Medium / 轉文字 API 替代伺服器，供效能測試與離線測試使用
+
+實作 NotionApi 用到的端點（含分頁、429 限流與可設定的延遲）、
+Medium 的 /posts 與 /images，以及 whisper 的 /audio/transcriptions。
+
+    python benchmarks/fake_server.py --port 8765 --ledger-rows 1000 --latency 0.05
+    NOTION_API_URL=http://127.0.0.1:8765/v1 MEDIUM_API_URL=http://127.0.0.1:8765/v1 python ledger_analysis.py
+"""
+
+import argparse
+import datetime
+import json
+import random
+import re
+import threading
+import time
+import urllib.parse
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LEDGER_DATABASE_ID = "43c59e00321e49a69d85037f0f45ba7e"
+RESULT_DATABASE_ID = "25c8303f78f780fd9227e5e9d54c6b43"
+PUBLISH_DATABASE_ID = "publish-database"
+
+LEDGER_SCHEMA = {
+    "名稱": "title",
+    "時間": "date",
+    "分類": "select",
+    "Paul": "number",
+    "Lily": "number",
+    "現金": "number",
+    "銀行存款": "number",
+}
+RESULT_SCHEMA = {"名稱": "title", "備註": "rich_text"}
+PUBLISH_SCHEMA = {"Name": "title", "狀態": "status", "Medium URL": "url"}
+
+CATEGORIES = ["娛樂", "飲食", "日常用品", "水電管理費", "交通", "薪資"]
+
+# 1x1 PNG
+IMAGE_BYTES = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+    "1f15c4890000000d49444154789c6360000002000100e221bc330000000049454e44ae426082"
+)
+
+
+def empty_value(prop_type: str):
+    return [] if prop_type in ("title", "rich_text") else None
+
+
+def to_page_value(prop_type: str, value):
+    """建立頁面時送來的屬性值轉成查詢結果的格式（補上 plain_text）"""
+    if prop_type in ("title", "rich_text"):
+        return [
+            dict(text, plain_text=text.get("plain_text", text.get("text", {}).get("content", "")))
+            for text in value
+        ]
+    return value
+
+
+class FakeNotion:
+    """記憶體中的 Notion / Medium 資料與請求統計"""
+
+    def __init__(self, latency: float = 0.0, throttle_rate: float = None, seed: int = 1):
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.databases = {}
+        self.pages = {}
+        self.blocks = {}
+        self.posts = []
+        self.request_counts = {}
+        self.throttled = 0
+        self.bytes_out = 0
+        self.tokens = throttle_rate or 0
+        self.updated_at = time.monotonic()
+
+        self.add_database(LEDGER_DATABASE_ID, LEDGER_SCHEMA)
+        self.add_database(RESULT_DATABASE_ID, RESULT_SCHEMA)
+        self.add_database(PUBLISH_DATABASE_ID, PUBLISH_SCHEMA)
+
+    # ---- 資料 ----
+
+    def add_database(self, database_id: str, schema: dict):
+        self.databases[database_id] = {"schema": schema, "pages": []}
+
+    def add_page(self, database_id: str, properties: dict, children: list = None) -> dict:
+        schema = self.databases[database_id]["schema"]
+        now = datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:00.000Z")
+        page = {
+            "object": "page",
+            "id": str(uuid.uuid4()),
+            "created_time": now,
+            "last_edited_time": now,
+            "archived": False,
+            "parent": {"type": "database_id", "database_id": database_id},
+            "properties": {
+                name: {
+                    "id": name,
+                    "type": prop_type,
+                    prop_type: to_page_value(prop_type, properties[name][prop_type])
+                    if name in properties else empty_value(prop_type)
+                }
+                for name, prop_type in schema.items()
+            }
+        }
+        with self.lock:
+            self.databases[database_id]["pages"].append(page)
+            self.pages[page["id"]] = page
+            self.blocks[page["id"]] = list(children or [])
+        return page
+
+    def generate_ledger(self, rows: int, year: int, month: int):
+        """產生指定月份的合成帳本記錄"""
+        days = (datetime.date(year + month // 12, month % 12 + 1, 1) - datetime.timedelta(days=1)).day
+        for i in range(rows):
+            amounts = {account: -self.random.randint(0, 500) if self.random.random() < 0.5 else None
+                       for account in ("Paul", "Lily", "現金", "銀行存款")}
+            properties = {
+                "名稱": {"title": [{"text": {"content": f"記錄 {i}"}}]},
+                "時間": {"date": {"start": f"{year}-{month:02d}-{i % days + 1:02d}", "end": None}},
+                "分類": {"select": {"name": self.random.choice(CATEGORIES)}},
+            }
+            properties.update({account: {"number": value} for account, value in amounts.items()})
+            self.add_page(LEDGER_DATABASE_ID, properties)
+
+    def generate_article(self, blocks: int, image_every: int = 50, base_url: str = "") -> str:
+        """產生約 blocks 個區塊的文章頁面（含巢狀列表與圖片），回傳頁面 ID"""
+        page = self.add_page(PUBLISH_DATABASE_ID, {
+            "Name": {"title": [{"text": {"content": f"合成文章 {blocks} 區塊"}}]},
+            "狀態": {"status": {"name": "Ready"}},
+        })
+        top = []
+        count = 0
+        while count < blocks:
+            if count % image_every == image_every - 1:
+                block = self.__block("image", {
+                    "type": "external",
+                    "external": {"url": f"{base_url}/files/image-{count}.png"},
+                    "caption": []
+                })
+            elif count % 10 == 9:
+                block = self.__block("bulleted_list_item", self.__rich_text(f"列表 {count}"))
+                children = [self.__block("bulleted_list_item", self.__rich_text(f"子項目 {count}-{j}")) for j in range(3)]
+                block["has_children"] = True
+                self.blocks[block["id"]] = children
+                count += len(children)
+            else:
+                block = self.__block("paragraph", self.__rich_text(f"段落 {count} " + "內容" * 20))
+            top.append(block)
+            count += 1
+
+        self.blocks[page["id"]] = top
+        return page["id"]
+
+    @staticmethod
+    def __rich_text(text: str) -> dict:
+        return {"rich_text": [{"type": "text", "plain_text": text, "annotations": {}, "href": None}]}
+
+    @staticmethod
+    def __block(block_type: str, data: dict) -> dict:
+        return {"object": "block", "id": str(uuid.uuid4()), "type": block_type, "has_children": False, block_type: data}
+
+    # ---- 統計與限流 ----
+
+    def record(self, endpoint: str):
+        with self.lock:
+            self.request_counts[endpoint] = self.request_counts.get(endpoint, 0) + 1
+
+    def allow(self) -> bool:
+        """伺服器端 token bucket，超過 throttle_rate 時回傳 False（回應 429）"""
+        if not self.throttle_rate:
+            return True
+
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.throttle_rate, self.tokens + (now - self.updated_at) * self.throttle_rate)
+            self.updated_at = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            self.throttled += 1
+            return False
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "requests": sum(self.request_counts.values()),
+                "by_endpoint": dict(self.request_counts),
+                "throttled": self.throttled,
+                "bytes_out": self.bytes_out,
+            }
+
+    def reset_stats(self):
+        with self.lock:
+            self.request_counts.clear()
+            self.throttled = 0
+            self.bytes_out = 0
+
+
+def parse_time(value: str) -> datetime.datetime:
+    """ISO 日期 / 時間轉成 UTC naive datetime 以便比較"""
+    parsed = datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo:
+        parsed = parsed.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def compare_time(value: str, condition: dict) -> bool:
+    if value is None:
+        return condition.get("is_empty", False)
+
+    value = parse_time(value)
+    for operator, target in condition.items():
+        if operator in ("is_empty", "is_not_empty"):
+            continue
+        target = parse_time(target)
+        if operator == "after" and not value > target:
+            return False
+        if operator == "before" and not value < target:
+            return False
+        if operator == "on_or_after" and not value >= target:
+            return False
+        if operator == "on_or_before" and not value <= target:
+            return False
+        if operator == "equals" and value != target:
+            return False
+    return True
+
+
+def matches(page: dict, condition: dict) -> bool:
+    """支援 NotionApi 使用到的 filter 子集合：and / or、時間戳記、date、title、select、status、number、url"""
+    if "and" in condition:
+        return all(matches(page, item) for item in condition["and"])
+    if "or" in condition:
+        return any(matches(page, item) for item in condition["or"])
+    if "timestamp" in condition:
+        timestamp = condition["timestamp"]
+        return compare_time(page[timestamp], condition[timestamp])
+
+    prop = page["properties"].get(condition["property"])
+    if prop is None:
+        return False
+
+    if "date" in condition:
+        date = prop["date"]
+        return compare_time(date["start"] if date else None, condition["date"])
+    if "title" in condition or "rich_text" in condition:
+        text = "".join(item["plain_text"] for item in prop[prop["type"]])
+        return text == condition.get("title", condition.get("rich_text"))["equals"]
+    for kind in ("select", "status"):
+        if kind in condition:
+            value = prop[prop["type"]]
+            return (value or {}).get("name") == condition[kind]["equals"]
+    if "number" in condition:
+        return prop["number"] == condition["number"]["equals"]
+    if "url" in condition:
+        return not prop["url"] if condition["url"].get("is_empty") else prop["url"] == condition["url"].get("equals")
+    return True
+
+
+def project(page: dict, property_ids: list) -> dict:
+    """filter_properties：只回傳指定的屬性"""
+    if not property_ids:
+        return page
+    return dict(page, properties={
+        name: value for name, value in page["properties"].items() if value["id"] in property_ids
+    })
+
+
+def make_handler(state: FakeNotion):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            self.__dispatch("GET")
+
+        def do_POST(self):
+            self.__dispatch("POST")
+
+        def do_PATCH(self):
+            self.__dispatch("PATCH")
+
+        def __dispatch(self, method: str):
+            parsed = urllib.parse.urlparse(self.path)
+            path = parsed.path
+            query = urllib.parse.parse_qs(parsed.query)
+            length = int(self.headers.get("Content-Length") or 0)
+            raw = self.rfile.read(length) if length else b""
+
+            for route_method, pattern, handler, throttled in ROUTES:
+                match = re.fullmatch(pattern, path)
+                if route_method == method and match:
+                    state.record(f"{method} {pattern.replace('([^/]+)', '{id}')}")
+                    if state.latency:
+                        time.sleep(state.latency)
+                    if throttled and not state.allow():
+                        return self.__send(429, {"object": "error", "code": "rate_limited"}, {"Retry-After": "1"})
+                    return handler(self, match, query, raw)
+
+            state.record(f"{method} (not found)")
+            self.__send(404, {"object": "error", "code": "object_not_found", "message": path})
+
+        def __send(self, status: int, payload, headers: dict = None, content_type: str = "application/json"):
+            body = payload if isinstance(payload, bytes) else json.dumps(payload, ensure_ascii=False).encode()
+            with state.lock:
+                state.bytes_out += len(body)
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        # ---- Notion ----
+
+        def query_database(self, match, query, raw):
+            database = state.databases.get(match.group(1))
+            if database is None:
+                return self.__send(404, {"object": "error", "code": "object_not_found"})
+
+            body = json.loads(raw or b"{}")
+            pages = [page for page in database["pages"] if not body.get("filter") or matches(page, body["filter"])]
+            self.__send(200, self.__paginate(
+                pages, body.get("start_cursor"), body.get("page_size", 100),
+                lambda page: project(page, query.get("filter_properties"))
+            ))
+
+        def get_database(self, match, query, raw):
+            database = state.databases.get(match.group(1))
+            if database is None:
+                return self.__send(404, {"object": "error", "code": "object_not_found"})
+
+            self.__send(200, {
+                "object": "database",
+                "id": match.group(1),
+                "properties": {name: {"id": name, "name": name, "type": prop_type}
+                               for name, prop_type in database["schema"].items()}
+            })
+
+        def create_page(self, match, query, raw):
+            body = json.loads(raw)
+            database_id = body["parent"]["database_id"]
+            if database_id not in state.databases:
+                return self.__send(404, {"object": "error", "code": "object_not_found"})
+            self.__send(200, state.add_page(database_id, body["properties"], body.get("children")))
+
+        def get_page(self, match, query, raw):
+            page = state.pages.get(match.group(1))
+            if page is None:
+                return self.__send(404, {"object": "error", "code": "object_not_found"})
+            self.__send(200, page)
+
+        def patch_page(self, match, query, raw):
+            page = state.pages.get(match.group(1))
+            if page is None:
+                return self.__send(404, {"object": "error", "code": "object_not_found"})
+
+            body = json.loads(raw)
+            with state.lock:
+                for name, value in body.get("properties", {}).items():
+                    prop = page["properties"].get(name)
+                    if prop:
+                        prop[prop["type"]] = to_page_value(prop["type"], value[prop["type"]])
+                if "archived" in body:
+                    page["archived"] = body["archived"]
+            self.__send(200, page)
+
+        def get_block_children(self, match, query, raw):
+            children = state.blocks.get(match.group(1))
+            if children is None:
+                return self.__send(404, {"object": "error", "code": "object_not_found"})
+
+            self.__send(200, self.__paginate(
+                children, query.get("start_cursor", [None])[0], int(query.get("page_size", ["100"])[0])
+            ))
+
+        def append_block_children(self, match, query, raw):
+            with state.lock:
+                children = state.blocks.setdefault(match.group(1), [])
+                children.extend(json.loads(raw)["children"])
+            self.__send(200, {"object": "list", "results": children, "has_more": False, "next_cursor": None})
+
+        @staticmethod
+        def __paginate(items: list, start_cursor: str, page_size: int, transform=None) -> dict:
+            start = int(start_cursor or 0)
+            end = start + min(page_size, 100)
+            results = items[start:end]
+            return {
+                "object": "list",
+                "results": [transform(item) for item in results] if transform else results,
+                "next_cursor": str(end) if end < len(items) else None,
+                "has_more": end < len(items),
+            }
+
+        # ---- Medium ----
+
+        def medium_me(self, match, query, raw):
+            self.__send(200, {"data": {"id": "fake-user", "username": "fake"}})
+
+        def medium_post(self, match, query, raw):
+            body = json.loads(raw)
+            with state.lock:
+                state.posts.append(body)
+                post_id = len(state.posts)
+            self.__send(201, {"data": {"id": str(post_id), "title": body["title"],
+                                       "url": f"https://medium.com/@fake/post-{post_id}"}})
+
+        def medium_image(self, match, query, raw):
+            self.__send(201, {"data": {"url": f"https://cdn-images.medium.com/{uuid.uuid4().hex}.png"}})
+
+        def download_file(self, match, query, raw):
+            self.__send(200, IMAGE_BYTES, content_type="image/png")
+
+        # ---- 轉文字 ----
+
+        def transcription(self, match, query, raw):
+            if b'name="response_format"\r\n\r\nverbose_json' in raw:
+                self.__send(200, {
+                    "task": "transcribe",
+                    "language": "chinese",
+                    "duration": 10.0,
+                    "text": "測試逐字稿",
+                    "segments": [
+                        {"id": 0, "seek": 0, "start": 0.0, "end": 5.0, "text": "測試", "tokens": [],
+                         "temperature": 0.0, "avg_logprob": 0.0, "compression_ratio": 1.0, "no_speech_prob": 0.0},
+                        {"id": 1, "seek": 0, "start": 5.0, "end": 10.0, "text": "逐字稿", "tokens": [],
+                         "temperature": 0.0, "avg_logprob": 0.0, "compression_ratio": 1.0, "no_speech_prob": 0.0},
+                    ]
+                })
+            else:
+                self.__send(200, "測試逐字稿\n".encode(), content_type="text/plain; charset=utf-8")
+
+    # (method, path, handler, 是否套用 Notion 的 429 限流)
+    ROUTES = [
+        ("POST", r"/v1/databases/([^/]+)/query", Handler.query_database, True),
+        ("GET", r"/v1/databases/([^/]+)", Handler.get_database, True),
+        ("POST", r"/v1/pages", Handler.create_page, True),
+        ("GET", r"/v1/pages/([^/]+)", Handler.get_page, True),
+        ("PATCH", r"/v1/pages/([^/]+)", Handler.patch_page, True),
+        ("GET", r"/v1/blocks/([^/]+)/children", Handler.get_block_children, True),
+        ("PATCH", r"/v1/blocks/([^/]+)/children", Handler.append_block_children, True),
+        ("GET", r"/v1/me", Handler.medium_me, False),
+        ("POST", r"/v1/users/([^/]+)/posts", Handler.medium_post, False),
+        ("POST", r"/v1/images", Handler.medium_image, False),
+        ("POST", r"/v1/audio/transcriptions", Handler.transcription, False),
+        ("GET", r"/files/([^/]+)", Handler.download_file, False),
+    ]
+    return Handler
+
+
+def start_server(state: FakeNotion, port: int = 0) -> ThreadingHTTPServer:
+    """在背景執行緒啟動伺服器，port 為 0 時自動選擇可用的埠"""
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(state))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="本機 Notion / Medium 替代伺服器")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="每個請求的延遲秒數")
+    parser.add_argument("--throttle-rate", type=float, help="每秒允許的請求數，超過時回應 429")
+    parser.add_argument("--ledger-rows", type=int, default=0, help="上個月的合成帳本記錄數")
+    parser.add_argument("--article-blocks", type=int, default=0, help="合成文章的區塊數")
+    args = parser.parse_args()
+
+    state = FakeNotion(args.latency, args.throttle_rate)
+    base_url = f"http://127.0.0.1:{args.port}"
+
+    today = datetime.date.today()
+    last_month = today.replace(day=1) - datetime.timedelta(days=1)
+    if args.ledger_rows:
+        state.generate_ledger(args.ledger_rows, last_month.year, last_month.month)
+    if args.article_blocks:
+        print(f"文章頁面 ID: {state.generate_article(args.article_blocks, base_url=base_url)}")
+
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(state))
+    print(f"NOTION_API_URL={base_url}/v1 MEDIUM_API_URL={base_url}/v1 OPENAI_BASE_URL={base_url}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(json.dumps(state.stats(), ensure_ascii=False, indent=2))
@@ -0,0 +1,133 @@
+"""
+離線效能測試：以 fake_server 替代 Notion / Medium，在不同資料量下執行
+ledger_analysis.py 與 post_a_note_to_medium.py，記錄執行時間、請求數與記憶體峰值
+
+    python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py --ledger-rows 1000,10000,100000 --article-blocks 100,1000,10000 --output bench.json
+"""
+
+import argparse
+import datetime
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from fake_server import FakeNotion, start_server
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 在子行程中執行腳本，結束時回報記憶體峰值（Linux 為 KB，macOS 為 bytes）
+RUNNER = """
+import resource, runpy, sys
+sys.path.insert(0, sys.argv[1])
+script = sys.argv[2]
+sys.argv = sys.argv[2:]
+try:
+    runpy.run_path(script, run_name="__main__")
+finally:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"__PEAK_RSS_KB__ {peak // 1024 if sys.platform == 'darwin' else peak}", file=sys.stderr)
+"""
+
+
+def run_script(state: FakeNotion, base_url: str, script: str, args: list, workdir: str) -> dict:
+    env = dict(
+        os.environ,
+        NOTION_SECRET="fake",
+        NOTION_API_URL=f"{base_url}/v1",
+        MEDIUM_API_URL=f"{base_url}/v1",
+        MEDIUM_TOKEN="fake",
+        MEDIUM_USER_ID="fake-user",
+        OPENAI_API_KEY="fake",
+        OPENAI_BASE_URL=f"{base_url}/v1",
+        # 共用限速器的狀態檔放在這次測試的工作目錄，不受同一台機器上其他工作影響
+        RATE_LIMIT_DIR=os.path.join(workdir, "rate_limits"),
+        # 每次測試使用全新的圖片上傳快取，圖片都會實際上傳
+        MEDIUM_IMAGE_CACHE=os.path.join(workdir, "medium_images.sqlite"),
+    )
+    env.pop("LEDGER_MIRROR", None)
+
+    state.reset_stats()
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", RUNNER, REPO_ROOT, os.path.join(REPO_ROOT, script), *args],
+        cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True
+    )
+    elapsed = time.perf_counter() - started
+
+    peak = None
+    for line in result.stderr.splitlines():
+        if line.startswith("__PEAK_RSS_KB__"):
+            peak = int(line.split()[1])
+    if result.returncode != 0:
+        raise Exception(f"{script} 執行失敗:\n{result.stderr}")
+
+    stats = state.stats()
+    return {
+        "seconds": round(elapsed, 3),
+        "requests": stats["requests"],
+        "throttled": stats["throttled"],
+        "response_bytes": stats["bytes_out"],
+        "peak_rss_mb": round(peak / 1024, 1) if peak else None,
+        "by_endpoint": stats["by_endpoint"],
+    }
+
+
+def bench_ledger(rows: int, latency: float, throttle_rate: float) -> dict:
+    today = datetime.date.today()
+    last_month = today.replace(day=1) - datetime.timedelta(days=1)
+
+    state = FakeNotion(latency, throttle_rate)
+    state.generate_ledger(rows, last_month.year, last_month.month)
+    server = start_server(state)
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            return run_script(state, f"http://127.0.0.1:{server.server_port}", "ledger_analysis.py", [], workdir)
+    finally:
+        server.shutdown()
+
+
+def bench_publish(blocks: int, latency: float, throttle_rate: float) -> dict:
+    state = FakeNotion(latency, throttle_rate)
+    server = start_server(state)
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    page_id = state.generate_article(blocks, base_url=base_url)
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            return run_script(state, base_url, "post_a_note_to_medium.py", [page_id], workdir)
+    finally:
+        server.shutdown()
+
+
+def parse_sizes(value: str) -> list:
+    return [int(size) for size in value.split(",") if size]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ledger_analysis / post_a_note_to_medium 離線效能測試")
+    parser.add_argument("--ledger-rows", type=parse_sizes, default=[1000, 10000], help="帳本記錄數，以逗號分隔")
+    parser.add_argument("--article-blocks", type=parse_sizes, default=[100, 1000], help="文章區塊數，以逗號分隔")
+    parser.add_argument("--latency", type=float, default=0.05, help="替代伺服器每個請求的延遲秒數")
+    parser.add_argument("--throttle-rate", type=float, help="替代伺服器每秒允許的請求數（超過回應 429）")
+    parser.add_argument("--output", help="將結果寫成 JSON 檔")
+    args = parser.parse_args()
+
+    results = []
+    for rows in args.ledger_rows:
+        result = dict(benchmark="ledger_analysis", size=rows, **bench_ledger(rows, args.latency, args.throttle_rate))
+        results.append(result)
+        print(f"ledger_analysis  {rows:>7} 筆  {result['seconds']:>8.2f}s  {result['requests']:>5} 請求  "
+              f"429: {result['throttled']:>3}  峰值記憶體 {result['peak_rss_mb']} MB")
+
+    for blocks in args.article_blocks:
+        result = dict(benchmark="post_a_note_to_medium", size=blocks, **bench_publish(blocks, args.latency, args.throttle_rate))
+        results.append(result)
+        print(f"post_to_medium   {blocks:>7} 區塊 {result['seconds']:>8.2f}s  {result['requests']:>5} 請求  "
+              f"429: {result['throttled']:>3}  峰值記憶體 {result['peak_rss_mb']} MB")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(results, file, ensure_ascii=False, indent=2)
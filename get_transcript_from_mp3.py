@@ -1,23 +1,299 @@
 from openai import OpenAI
-import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import argparse
+import glob
+import hashlib
 import os
+import re
+import shutil
+import subprocess
+import tempfile
 
-client = OpenAI()
+# whisper-1 單次上傳的檔案大小上限
+MAX_UPLOAD_BYTES = 25 * 1024 * 1024
 
-file_path = "output.txt"
-if os.path.exists(file_path):
-    os.remove(file_path)
+AUDIO_EXTENSIONS = (".mp3", ".m4a", ".mp4", ".mpeg", ".mpga", ".wav", ".webm", ".ogg", ".flac")
 
-input_filename = sys.argv[1]
 
-audio_file= open(input_filename, "rb")
-transcription = client.audio.transcriptions.create(
-    model="whisper-1", 
-    file=audio_file,
-    response_format="text"
-)
-print(transcription)
+def transcribe(client, input_filename: str) -> str:
+    """整個檔案一次上傳轉成文字"""
+    with open(input_filename, "rb") as audio_file:
+        return client.audio.transcriptions.create(
+            model="whisper-1",
+            file=audio_file,
+            response_format="text"
+        )
 
-file = open("output.txt", "w")
-file.write(transcription)
-file.close()
\ No newline at end of file
+
+def transcribe_chunked(client, input_filename: str, chunk_seconds: float = 600, max_workers: int = 4) -> str:
+    """長音檔依靜音切段後同時轉文字，依時間順序合併並加上時間戳記
+
+    每段長度不超過 chunk_seconds，且依檔案位元率估算不超過上傳上限。
+    """
+    if not shutil.which("ffmpeg"):
+        raise ValueError("分段轉文字需要先安裝 ffmpeg")
+
+    duration, silences = detect_silences(input_filename)
+    bytes_per_second = os.path.getsize(input_filename) / duration
+    max_seconds = min(chunk_seconds, MAX_UPLOAD_BYTES * 0.9 / bytes_per_second)
+    segments = plan_segments(duration, silences, max_seconds)
+    print(f"音檔長度 {format_timestamp(duration)}，切成 {len(segments)} 段")
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = split_audio(input_filename, segments, directory)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = executor.map(
+                lambda args: transcribe_segment(client, *args),
+                [(path, start) for path, (start, _) in zip(paths, segments)]
+            )
+            lines = [line for segment_lines in results for line in segment_lines]
+
+    return "\n".join(lines)
+
+
+def transcribe_auto(client, input_filename: str, chunk: bool = False, chunk_seconds: float = 600,
+                    max_workers: int = 4) -> str:
+    """小檔案一次上傳；指定分段或超過上傳上限時改用分段轉文字"""
+    if chunk or os.path.getsize(input_filename) > MAX_UPLOAD_BYTES:
+        return transcribe_chunked(client, input_filename, chunk_seconds, max_workers)
+    return transcribe(client, input_filename)
+
+
+def transcribe_batch(client, pattern: str, cache_dir: str = ".cache/transcripts", max_files: int = 2,
+                     compress: bool = False, **options) -> dict:
+    """批次轉換目錄或 glob 中的所有音檔，逐檔輸出同名 .txt
+
+    以檔案內容的 SHA-256 與輸出模式（是否分段及每段秒數）快取轉換結果，重新執行時只處理新的錄音。
+    回傳 {音檔路徑: 文字檔路徑}（失敗的檔案為 None）。
+    """
+    if os.path.isdir(pattern):
+        paths = sorted(
+            os.path.join(root, name)
+            for root, _, names in os.walk(pattern)
+            for name in names
+            if name.lower().endswith(AUDIO_EXTENSIONS)
+        )
+    else:
+        paths = sorted(path for path in glob.glob(pattern, recursive=True) if path.lower().endswith(AUDIO_EXTENSIONS))
+
+    os.makedirs(cache_dir, exist_ok=True)
+    print(f"待處理音檔: {len(paths)} 個")
+
+    # 分段轉文字的結果含時間戳記，與一次上傳的結果分開快取
+    mode = f".chunk{options.get('chunk_seconds', 600):g}" if options.get("chunk") else ""
+
+    results = {}
+    pending = {}
+    for path in paths:
+        output_path = os.path.splitext(path)[0] + ".txt"
+        cache_path = os.path.join(cache_dir, f"{file_sha256(path)}{mode}.txt")
+
+        if os.path.exists(cache_path):
+            print(f"已有轉換結果，跳過: {path}")
+            shutil.copyfile(cache_path, output_path)
+            results[path] = output_path
+        else:
+            pending[path] = (output_path, cache_path)
+
+    def process(path, upload_path):
+        output_path, cache_path = pending[path]
+        try:
+            print(f"轉換中: {path}")
+            transcription = transcribe_auto(client, upload_path, **options)
+
+            # 先寫入暫存檔再改名，中斷時不會留下不完整的快取
+            with open(f"{cache_path}.tmp", "w") as file:
+                file.write(transcription)
+            os.replace(f"{cache_path}.tmp", cache_path)
+            shutil.copyfile(cache_path, output_path)
+            return output_path
+        except Exception as e:
+            print(f"轉換失敗 {path}: {e}")
+            return None
+
+    with tempfile.TemporaryDirectory() as directory:
+        upload_paths = precompress(list(pending), directory) if compress and pending else {}
+
+        with ThreadPoolExecutor(max_workers=max_files) as executor:
+            results.update(zip(pending, executor.map(
+                lambda path: process(path, upload_paths.get(path, path)), pending
+            )))
+
+    return results
+
+
+def compress_audio(input_filename: str, output_dir: str):
+    """轉成單聲道、16 kHz、低位元率的語音用 mp3，回傳 (輸出路徑, 原始大小, 壓縮後大小)"""
+    name = os.path.splitext(os.path.basename(input_filename))[0]
+    output_path = os.path.join(output_dir, f"{name}_{hashlib.sha1(input_filename.encode()).hexdigest()[:8]}.mp3")
+
+    result = subprocess.run(
+        ["ffmpeg", "-hide_banner", "-loglevel", "error", "-y", "-i", input_filename,
+         "-vn", "-ac", "1", "-ar", "16000", "-c:a", "libmp3lame", "-b:a", "32k", output_path],
+        capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise Exception(f"無法壓縮音檔 {input_filename}: {result.stderr}")
+
+    return output_path, os.path.getsize(input_filename), os.path.getsize(output_path)
+
+
+def precompress(paths: list, output_dir: str, max_workers: int = None) -> dict:
+    """以多個行程同時壓縮音檔，回傳 {原始路徑: 壓縮後路徑}；壓縮失敗或壓縮後反而較大的檔案維持原檔"""
+    if not shutil.which("ffmpeg"):
+        raise ValueError("壓縮音檔需要先安裝 ffmpeg")
+
+    compressed = {}
+    total_before = 0
+    total_after = 0
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(compress_audio, path, output_dir) for path in paths]
+        for path, future in zip(paths, futures):
+            # 單一檔案壓縮失敗時改上傳原檔，不影響其他檔案
+            try:
+                output_path, before, after = future.result()
+            except Exception as e:
+                print(f"壓縮 {path} 失敗，改用原檔: {e}")
+                continue
+
+            if after < before:
+                compressed[path] = output_path
+            else:
+                after = before
+            total_before += before
+            total_after += after
+            print(f"壓縮 {path}: {before / 1048576:.1f} MB -> {after / 1048576:.1f} MB")
+
+    print(f"壓縮共節省 {(total_before - total_after) / 1048576:.1f} MB "
+          f"({total_before / max(total_after, 1):.1f} 倍)")
+    return compressed
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def detect_silences(input_filename: str, noise: str = "-30dB", min_silence: float = 0.5):
+    """以 ffmpeg silencedetect 找出靜音區間，回傳 (總長度秒數, [(開始, 結束), ...])"""
+    result = subprocess.run(
+        ["ffmpeg", "-hide_banner", "-nostats", "-i", input_filename,
+         "-af", f"silencedetect=noise={noise}:d={min_silence}", "-f", "null", "-"],
+        capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise Exception(f"無法分析音檔: {result.stderr}")
+
+    match = re.search(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)", result.stderr)
+    if not match:
+        raise Exception(f"無法取得音檔長度: {input_filename}")
+    hours, minutes, seconds = match.groups()
+    duration = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+    starts = [float(value) for value in re.findall(r"silence_start: (-?\d+(?:\.\d+)?)", result.stderr)]
+    ends = [float(value) for value in re.findall(r"silence_end: (\d+(?:\.\d+)?)", result.stderr)]
+    return duration, list(zip(starts, ends))
+
+
+def plan_segments(duration: float, silences: list, max_seconds: float) -> list:
+    """盡量在靜音中點切段，每段不超過 max_seconds；找不到靜音時直接在上限處切"""
+    cut_points = [(start + end) / 2 for start, end in silences]
+    segments = []
+    start = 0.0
+
+    while duration - start > max_seconds:
+        candidates = [point for point in cut_points if start < point <= start + max_seconds]
+        end = candidates[-1] if candidates else start + max_seconds
+        segments.append((start, end))
+        start = end
+
+    segments.append((start, duration))
+    return segments
+
+
+def split_audio(input_filename: str, segments: list, directory: str) -> list:
+    """依切段時間輸出各段音檔（不重新編碼）"""
+    extension = os.path.splitext(input_filename)[1] or ".mp3"
+    paths = []
+
+    for i, (start, end) in enumerate(segments):
+        path = os.path.join(directory, f"segment_{i:04d}{extension}")
+        result = subprocess.run(
+            ["ffmpeg", "-hide_banner", "-loglevel", "error", "-y",
+             "-ss", f"{start:.3f}", "-t", f"{end - start:.3f}", "-i", input_filename, "-c", "copy", path],
+            capture_output=True, text=True
+        )
+        if result.returncode != 0:
+            raise Exception(f"無法切割音檔: {result.stderr}")
+        paths.append(path)
+
+    return paths
+
+
+def transcribe_segment(client, path: str, offset: float) -> list:
+    """轉換單一段落，時間戳記加上該段在原始音檔中的起點"""
+    with open(path, "rb") as audio_file:
+        transcription = client.audio.transcriptions.create(
+            model="whisper-1",
+            file=audio_file,
+            response_format="verbose_json"
+        )
+
+    return [
+        f"[{format_timestamp(offset + segment.start)}] {segment.text.strip()}"
+        for segment in transcription.segments or []
+    ]
+
+
+def format_timestamp(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="使用 whisper-1 將音檔轉成文字")
+    parser.add_argument("input_filename", nargs="?", help="音檔路徑")
+    parser.add_argument("--batch", metavar="DIR_OR_GLOB", help="批次轉換目錄或 glob 中的所有音檔，文字檔輸出在音檔旁")
+    parser.add_argument("--batch-workers", type=int, default=2, help="批次模式同時處理的檔案數")
+    parser.add_argument("--cache-dir", default=".cache/transcripts", help="批次模式的轉換結果快取目錄")
+    parser.add_argument("--compress", action="store_true", help="上傳前先轉成單聲道低位元率語音，減少上傳量")
+    parser.add_argument("--chunk", action="store_true", help="依靜音切段後同時轉文字（超過 25 MB 的檔案會自動使用）")
+    parser.add_argument("--chunk-seconds", type=float, default=600, help="每段最長秒數")
+    parser.add_argument("--workers", type=int, default=4, help="同時轉換的段數")
+    parser.add_argument("--base-url", help="轉文字 API 的位址（例如本機測試用的替代伺服器），預設使用 OPENAI_BASE_URL 或官方 API")
+    args = parser.parse_args()
+
+    if not args.input_filename and not args.batch:
+        parser.print_usage()
+        raise SystemExit(1)
+
+    client = OpenAI(base_url=args.base_url)
+    options = {"chunk": args.chunk, "chunk_seconds": args.chunk_seconds, "max_workers": args.workers}
+
+    if args.batch:
+        results = transcribe_batch(client, args.batch, args.cache_dir, args.batch_workers, args.compress, **options)
+        failed = [path for path, output_path in results.items() if output_path is None]
+        print(f"批次轉換完成: 成功 {len(results) - len(failed)} 個, 失敗 {len(failed)} 個")
+        if failed:
+            raise SystemExit(1)
+    else:
+        file_path = "output.txt"
+        if os.path.exists(file_path):
+            os.remove(file_path)
+
+        with tempfile.TemporaryDirectory() as directory:
+            upload_path = args.input_filename
+            if args.compress:
+                upload_path = precompress([args.input_filename], directory).get(upload_path, upload_path)
+
+            transcription = transcribe_auto(client, upload_path, **options)
+        print(transcription)
+
+        with open(file_path, "w") as file:
+            file.write(transcription)
@@ -0,0 +1,106 @@
+import os
+import sqlite3
+import threading
+import time
+import urllib.parse
+
+
+def is_stable_url(url: str) -> bool:
+    """Notion 檔案是帶簽章的暫時 URL，每次請求都不同，不適合當快取鍵"""
+    query = urllib.parse.parse_qs(urllib.parse.urlparse(url).query)
+    return not any(key.startswith("X-Amz-") or key in ("Expires", "Signature") for key in query)
+
+
+class ImageUploadCache:
+    """Medium 圖片上傳結果的本機快取
+
+    以圖片內容的 SHA-256 對應上傳後的 Medium URL，內容不變就不必重新上傳；
+    外部圖片另外以 URL 建立索引，連下載都能省略。記錄的圖片總大小超過 max_bytes
+    或項目數超過 max_entries 時，淘汰最久未使用的項目。
+    """
+
+    def __init__(self, path: str, max_bytes: int = 1024 ** 3, max_entries: int = 5000):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS uploads (
+                sha256 TEXT PRIMARY KEY,
+                medium_url TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS uploads_last_used ON uploads (last_used);
+            CREATE TABLE IF NOT EXISTS urls (
+                url TEXT PRIMARY KEY,
+                sha256 TEXT NOT NULL
+            );
+        """)
+
+    def close(self):
+        self.db.close()
+
+    def lookup_url(self, url: str) -> str:
+        """以圖片 URL 查詢（僅限固定不變的外部 URL），沒有則回傳 None"""
+        if not is_stable_url(url):
+            return None
+
+        with self.lock, self.db:
+            row = self.db.execute(
+                "SELECT uploads.sha256, medium_url FROM urls JOIN uploads USING (sha256) WHERE url = ?",
+                (url,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            self.__touch(row[0])
+            return row[1]
+
+    def lookup_content(self, sha256: str, url: str = None) -> str:
+        """以圖片內容雜湊查詢，命中時順便記錄 URL 索引，沒有則回傳 None"""
+        with self.lock, self.db:
+            row = self.db.execute("SELECT medium_url FROM uploads WHERE sha256 = ?", (sha256,)).fetchone()
+            if row is None:
+                return None
+
+            self.__touch(sha256)
+            self.__remember_url(url, sha256)
+            return row[0]
+
+    def store(self, sha256: str, medium_url: str, size: int, url: str = None):
+        with self.lock, self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO uploads (sha256, medium_url, size, last_used) VALUES (?, ?, ?, ?)",
+                (sha256, medium_url, size, time.time())
+            )
+            self.__remember_url(url, sha256)
+            self.__evict()
+
+    def __touch(self, sha256: str):
+        self.db.execute("UPDATE uploads SET last_used = ? WHERE sha256 = ?", (time.time(), sha256))
+
+    def __remember_url(self, url: str, sha256: str):
+        if url and is_stable_url(url):
+            self.db.execute("INSERT OR REPLACE INTO urls (url, sha256) VALUES (?, ?)", (url, sha256))
+
+    def __evict(self):
+        # 由最近使用的項目開始累計大小，超出位元組或項目數上限之後的項目全部淘汰
+        self.db.execute("""
+            DELETE FROM uploads WHERE sha256 IN (
+                SELECT sha256 FROM (
+                    SELECT
+                        sha256,
+                        ROW_NUMBER() OVER recent AS position,
+                        SUM(size) OVER recent AS total_size
+                    FROM uploads
+                    WINDOW recent AS (ORDER BY last_used DESC ROWS UNBOUNDED PRECEDING)
+                )
+                WHERE position > ? OR total_size > ?
+            )
+        """, (self.max_entries, self.max_bytes))
+        self.db.execute("DELETE FROM urls WHERE sha256 NOT IN (SELECT sha256 FROM uploads)")
@@ -0,0 +1,389 @@
+"""
+常駐的工作執行器：以內建的 cron 排程執行各個工作，工作之間共用已建立的連線池
+
+    python job_runner.py                          # 常駐執行
+    python job_runner.py --once                   # 執行到期（含停機期間錯過）的工作後結束
+    python job_runner.py --run ledger-analysis    # 立即執行指定工作
+    python job_runner.py --config jobs.json       # 使用自訂的工作清單
+
+工作清單為 JSON 陣列，每個工作指定名稱、cron 排程（UTC，與 GitHub Actions 相同）、
+"模組:函式" 形式的目標、額外參數、要注入的共用客戶端（參數名稱 → async_notion / notion / openai），
+以及要注入的排程時間（參數名稱 → scheduled_at：這次的排程時間 / last_success：上次成功的排程時間）：
+
+    [
+        {"name": "ledger-analysis", "schedule": "0 0 1 * *", "target": "ledger_analysis:run",
+         "clients": {"async_notion_api": "async_notion"},
+         "schedule_kwargs": {"scheduled_at": "scheduled_at", "last_success": "last_success"}},
+        {"name": "publish-medium", "schedule": "0 * * * *", "target": "post_a_note_to_medium:publish_ready_pages",
+         "kwargs": {"database_id": "...", "published_value": "Published"}, "clients": {"notion_api": "notion"}},
+        {"name": "transcripts", "schedule": "*/30 * * * *", "target": "get_transcript_from_mp3:transcribe_batch",
+         "kwargs": {"pattern": "recordings"}, "clients": {"client": "openai"}}
+    ]
+
+工作模組在第一次執行時才匯入，之後重複使用；上次執行時間保存在狀態檔，重新啟動後會補做錯過的排程（每個工作一次）。
+執行失敗時不推進上次執行時間，retry_delay 秒後重試。
+"""
+
+import argparse
+import datetime
+import importlib
+import json
+import os
+import threading
+import time
+import traceback
+
+from metrics import RequestMetrics
+
+DEFAULT_JOBS = [
+    {
+        "name": "ledger-analysis",
+        # 每月 1 號 0:00 UTC（台灣時間早上 8:00），同 monthly-ledger-analysis.yml
+        "schedule": "0 0 1 * *",
+        "target": "ledger_analysis:run",
+        "clients": {"async_notion_api": "async_notion"},
+        # 依排程時間決定要處理的月份，並補上上次成功之後錯過的月份
+        "schedule_kwargs": {"scheduled_at": "scheduled_at", "last_success": "last_success"}
+    }
+]
+
+SCHEDULE_VALUES = ("scheduled_at", "last_success")
+
+CRON_ALIASES = {
+    "@yearly": "0 0 1 1 *",
+    "@monthly": "0 0 1 * *",
+    "@weekly": "0 0 * * 0",
+    "@daily": "0 0 * * *",
+    "@hourly": "0 * * * *",
+}
+
+
+def parse_cron_field(field: str, low: int, high: int) -> set:
+    """解析單一 cron 欄位，支援 *、數字、a-b、逗號分隔與 /n 間隔"""
+    values = set()
+    for part in field.split(","):
+        step = 1
+        if "/" in part:
+            part, step_text = part.split("/", 1)
+            step = int(step_text)
+            if step <= 0:
+                raise ValueError(f"cron 間隔需大於 0: {field}")
+
+        if part == "*":
+            start, end = low, high
+        elif "-" in part:
+            start, end = (int(value) for value in part.split("-", 1))
+        else:
+            start = int(part)
+            end = high if step > 1 else start
+
+        if start < low or end > high or start > end:
+            raise ValueError(f"cron 欄位超出範圍 {low}-{high}: {field}")
+        values.update(range(start, end + 1, step))
+
+    return values
+
+
+class CronSchedule:
+    """五個欄位的 cron 表示式（分 時 日 月 星期），星期 0 與 7 皆為星期日"""
+
+    def __init__(self, expression: str):
+        self.expression = expression
+        fields = CRON_ALIASES.get(expression, expression).split()
+        if len(fields) != 5:
+            raise ValueError(f"cron 表示式需有 5 個欄位: {expression}")
+
+        self.minutes = parse_cron_field(fields[0], 0, 59)
+        self.hours = parse_cron_field(fields[1], 0, 23)
+        self.days = parse_cron_field(fields[2], 1, 31)
+        self.months = parse_cron_field(fields[3], 1, 12)
+        self.weekdays = {weekday % 7 for weekday in parse_cron_field(fields[4], 0, 7)}
+        # 日與星期都有限定時，符合其中一個即可（與 cron 相同）
+        self.restrict_both_days = fields[2] != "*" and fields[4] != "*"
+
+    def matches_day(self, moment: datetime.datetime) -> bool:
+        day_matches = moment.day in self.days
+        weekday_matches = moment.isoweekday() % 7 in self.weekdays
+        if self.restrict_both_days:
+            return day_matches or weekday_matches
+        return day_matches and weekday_matches
+
+    def next_after(self, moment: datetime.datetime) -> datetime.datetime:
+        """moment 之後（不含）的下一個排程時間"""
+        moment = moment.replace(second=0, microsecond=0) + datetime.timedelta(minutes=1)
+        limit = moment.year + 5
+
+        while moment.year <= limit:
+            if moment.month not in self.months:
+                moment = (moment.replace(day=1, hour=0, minute=0) + datetime.timedelta(days=32)).replace(day=1)
+            elif not self.matches_day(moment):
+                moment = moment.replace(hour=0, minute=0) + datetime.timedelta(days=1)
+            elif moment.hour not in self.hours:
+                moment = moment.replace(minute=0) + datetime.timedelta(hours=1)
+            elif moment.minute not in self.minutes:
+                moment += datetime.timedelta(minutes=1)
+            else:
+                return moment
+
+        raise ValueError(f"cron 表示式不會觸發: {self.expression}")
+
+
+class Job:
+    """一個排程工作；target 為 "模組:函式"，第一次執行時才匯入"""
+
+    def __init__(self, name: str, schedule: str, target: str, kwargs: dict = None, clients: dict = None,
+                 schedule_kwargs: dict = None):
+        self.name = name
+        self.schedule = CronSchedule(schedule)
+        self.target = target
+        self.kwargs = kwargs or {}
+        self.clients = clients or {}
+        self.schedule_kwargs = schedule_kwargs or {}
+        self.function = None
+
+        for value in self.schedule_kwargs.values():
+            if value not in SCHEDULE_VALUES:
+                raise ValueError(f"未知的排程時間: {value}（可用 {', '.join(SCHEDULE_VALUES)}）")
+
+    def load(self):
+        if self.function is None:
+            module_name, function_name = self.target.split(":", 1)
+            self.function = getattr(importlib.import_module(module_name), function_name)
+        return self.function
+
+
+class SharedClients:
+    """工作之間共用的客戶端，第一次使用時才建立，之後沿用同一個連線池與速率限制
+
+    - async_notion: AsyncNotionApi
+    - notion: 上述 AsyncNotionApi 內部的 NotionApi（共用連線池與 token bucket）
+    - openai: OpenAI 客戶端
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.clients = {}
+        self.metrics = RequestMetrics()
+
+    def get(self, kind: str):
+        with self.lock:
+            return self.__get(kind)
+
+    def record(self, record: dict):
+        """Notion 請求的 hook，記錄到目前執行中工作的指標"""
+        self.metrics.record(record)
+
+    def close(self):
+        with self.lock:
+            for client in self.clients.values():
+                client.close()
+            self.clients.clear()
+
+    def __get(self, kind: str):
+        if kind not in self.clients:
+            if kind == "async_notion":
+                from notion_api import AsyncNotionApi
+
+                notion_secret = os.getenv("NOTION_SECRET")
+                if not notion_secret:
+                    raise ValueError("請設定 NOTION_SECRET 環境變數")
+                self.clients[kind] = AsyncNotionApi(
+                    notion_secret,
+                    schema_cache_path=".cache/notion_schema.json",
+                    request_hooks=[self.record]
+                )
+            elif kind == "notion":
+                return self.__get("async_notion").api
+            elif kind == "openai":
+                from openai import OpenAI
+
+                self.clients[kind] = OpenAI()
+            else:
+                raise ValueError(f"未知的客戶端類型: {kind}")
+
+        return self.clients[kind]
+
+
+class JobRunner:
+    """依 cron 排程執行工作，並將每個工作最後一次的排程時間保存在 state_path"""
+
+    def __init__(self, jobs: list, state_path: str = ".cache/job_runner_state.json", catch_up: bool = True,
+                 retry_delay: float = 900):
+        self.jobs = {job.name: job for job in jobs}
+        self.state_path = state_path
+        self.catch_up = catch_up
+        self.retry_delay = retry_delay
+        self.clients = SharedClients()
+        self.state = self.__load_state()
+
+    def close(self):
+        self.clients.close()
+
+    def run_job(self, job: Job, scheduled_at: datetime.datetime = None) -> bool:
+        """執行一個工作，失敗時印出錯誤並回傳 False，不影響其他工作
+
+        未指定 scheduled_at（立即執行）時以開始時間作為排程時間。
+        """
+        started_at = datetime.datetime.now(datetime.timezone.utc)
+        scheduled_at = scheduled_at or started_at
+        print(f"[{started_at.isoformat(timespec='seconds')}] 開始執行 {job.name}")
+        schedule_values = {"scheduled_at": scheduled_at, "last_success": self.__last_success(job)}
+
+        self.clients.metrics = RequestMetrics()
+        started = time.perf_counter()
+        try:
+            kwargs = dict(job.kwargs)
+            for parameter, kind in job.clients.items():
+                kwargs[parameter] = self.clients.get(kind)
+            for parameter, value in job.schedule_kwargs.items():
+                kwargs[parameter] = schedule_values[value]
+            job.load()(**kwargs)
+            success = True
+        except Exception:
+            traceback.print_exc()
+            success = False
+
+        elapsed = time.perf_counter() - started
+        print(self.clients.metrics.summary())
+        print(f"{job.name} {'完成' if success else '失敗'}，耗時 {elapsed:.1f}s")
+
+        state = dict(self.state.get(job.name, {}), started_at=started_at.isoformat(),
+                     seconds=round(elapsed, 3), success=success)
+        if success:
+            state.update(last_run=scheduled_at.isoformat(), last_success=scheduled_at.isoformat())
+            state.pop("retry_at", None)
+        else:
+            # 不推進 last_run，稍後重試同一個排程；重試前又到了下一次排程時直接執行最新的排程
+            retry_at = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=self.retry_delay)
+            state["retry_at"] = retry_at.isoformat()
+            print(f"{job.name} 將於 {retry_at.isoformat(timespec='seconds')} 重試")
+        self.state[job.name] = state
+        self.__save_state()
+        return success
+
+    def run_pending(self, now: datetime.datetime = None) -> list:
+        """執行所有到期的工作；停機期間錯過多次排程的工作只補做一次。回傳執行的工作名稱"""
+        now = now or datetime.datetime.now(datetime.timezone.utc)
+        executed = []
+
+        for job in self.jobs.values():
+            last_run = self.__last_run(job)
+            if last_run is None:
+                # 第一次看到的工作從現在開始排程，不補做過去的排程
+                self.state[job.name] = {"last_run": now.isoformat()}
+                self.__save_state()
+                continue
+
+            scheduled_at = None
+            next_run = job.schedule.next_after(last_run)
+            while next_run <= now:
+                scheduled_at = next_run
+                next_run = job.schedule.next_after(next_run)
+            if scheduled_at is None:
+                continue
+
+            retry_at = self.__retry_at(job)
+            if retry_at is not None and retry_at > now:
+                continue
+
+            # 失敗後的重試不算錯過的排程
+            missed = now - scheduled_at > datetime.timedelta(minutes=1)
+            if missed and not self.catch_up and retry_at is None:
+                print(f"略過 {job.name} 錯過的排程 {scheduled_at.isoformat()}")
+                self.state[job.name] = dict(self.state.get(job.name, {}), last_run=scheduled_at.isoformat())
+                self.__save_state()
+                continue
+
+            self.run_job(job, scheduled_at)
+            executed.append(job.name)
+
+        return executed
+
+    def next_run_time(self) -> datetime.datetime:
+        now = datetime.datetime.now(datetime.timezone.utc)
+        return min(
+            max(job.schedule.next_after(self.__last_run(job) or now), self.__retry_at(job) or now)
+            for job in self.jobs.values()
+        )
+
+    def run_forever(self, max_sleep: float = 60):
+        """常駐執行；每次最多睡 max_sleep 秒，系統時間變動或休眠後仍能準時觸發"""
+        print(f"工作執行器啟動，共 {len(self.jobs)} 個工作: {', '.join(self.jobs)}")
+        while True:
+            self.run_pending()
+            delay = (self.next_run_time() - datetime.datetime.now(datetime.timezone.utc)).total_seconds()
+            time.sleep(min(max(delay, 0), max_sleep))
+
+    def __last_run(self, job: Job):
+        return self.__state_time(job, "last_run")
+
+    def __last_success(self, job: Job):
+        return self.__state_time(job, "last_success")
+
+    def __retry_at(self, job: Job):
+        return self.__state_time(job, "retry_at")
+
+    def __state_time(self, job: Job, key: str):
+        value = self.state.get(job.name, {}).get(key)
+        return datetime.datetime.fromisoformat(value) if value else None
+
+    def __load_state(self) -> dict:
+        if not os.path.exists(self.state_path):
+            return {}
+
+        with open(self.state_path, encoding="utf-8") as file:
+            return json.load(file)
+
+    def __save_state(self):
+        directory = os.path.dirname(self.state_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # 先寫入暫存檔再改名，中斷時不會留下不完整的狀態檔
+        with open(f"{self.state_path}.tmp", "w", encoding="utf-8") as file:
+            json.dump(self.state, file, ensure_ascii=False, indent=2)
+        os.replace(f"{self.state_path}.tmp", self.state_path)
+
+
+def load_jobs(config_path: str = None) -> list:
+    if config_path:
+        with open(config_path, encoding="utf-8") as file:
+            definitions = json.load(file)
+    else:
+        definitions = DEFAULT_JOBS
+
+    return [Job(**definition) for definition in definitions]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="以內建 cron 排程常駐執行工作")
+    parser.add_argument("--config", help="工作清單 JSON 檔，未指定時使用內建的工作")
+    parser.add_argument("--state", default=".cache/job_runner_state.json", help="保存上次執行時間的狀態檔")
+    parser.add_argument("--once", action="store_true", help="執行到期的工作後結束")
+    parser.add_argument("--run", metavar="JOB", action="append", help="立即執行指定的工作後結束，可重複指定")
+    parser.add_argument("--list", action="store_true", help="列出工作與下次執行時間")
+    parser.add_argument("--no-catch-up", action="store_true", help="不補做停機期間錯過的排程")
+    args = parser.parse_args()
+
+    runner = JobRunner(load_jobs(args.config), args.state, catch_up=not args.no_catch_up)
+    try:
+        if args.list:
+            now = datetime.datetime.now(datetime.timezone.utc)
+            for job in runner.jobs.values():
+                print(f"{job.name:<20} {job.schedule.expression:<15} {job.target:<45} "
+                      f"下次執行: {job.schedule.next_after(now).isoformat()}")
+        elif args.run:
+            unknown = [name for name in args.run if name not in runner.jobs]
+            if unknown:
+                parser.error(f"未知的工作: {', '.join(unknown)}")
+            failed = [name for name in args.run if not runner.run_job(runner.jobs[name])]
+            if failed:
+                raise SystemExit(1)
+        elif args.once:
+            runner.run_pending()
+        else:
+            runner.run_forever()
+    except KeyboardInterrupt:
+        print("工作執行器停止")
+    finally:
+        runner.close()
@@ -0,0 +1,154 @@
+import json
+import re
+
+# 有安裝 orjson 時用來解析每筆結果，否則使用標準函式庫
+try:
+    import orjson
+
+    loads = orjson.loads
+except ImportError:
+    loads = json.loads
+
+WHITESPACE = b" \t\r\n"
+# 容器與字串外：下一個會改變巢狀深度或進入字串的字元
+STRUCTURAL = re.compile(rb'[\[\]{}"]')
+# 字串內：下一個引號或跳脫字元
+STRING_SPECIAL = re.compile(rb'["\\]')
+# 數字、true、false、null 的結尾
+SCALAR_END = re.compile(rb'[\s,\]}]')
+
+
+class ResultStream:
+    """邊接收邊解析 Notion 列表回應（{"results": [...], "has_more": ..., ...}）
+
+    逐筆產出 results 中的項目，已解析的位元組立即釋放，記憶體用量只與單筆項目大小有關；
+    迭代結束後，其餘頂層欄位（has_more、next_cursor 等）放在 metadata。
+    回應需以 stream=True 取得；回應帶有 on_consumed(bytes_read) 時（NotionApi 的請求指標），
+    讀完或中途關閉後以實際接收的位元組數呼叫。
+    """
+
+    def __init__(self, response, chunk_size: int = 64 * 1024):
+        self.response = response
+        self.chunks = response.iter_content(chunk_size)
+        self.buffer = bytearray()
+        self.metadata = {}
+        self.bytes_read = 0
+
+    def __iter__(self):
+        try:
+            pos = self.__expect(0, b"{")
+            while True:
+                pos, char = self.__skip_whitespace(pos)
+                if char == b"}":
+                    break
+                if char == b",":
+                    pos, char = self.__skip_whitespace(pos + 1)
+
+                end = self.__value_end(pos)
+                key = loads(bytes(self.buffer[pos:end]))
+                pos = self.__expect(end, b":")
+                pos, char = self.__skip_whitespace(pos)
+
+                if key == "results":
+                    pos = yield from self.__iter_array(pos)
+                else:
+                    end = self.__value_end(pos)
+                    self.metadata[key] = loads(bytes(self.buffer[pos:end]))
+                    pos = end
+        finally:
+            self.response.close()
+            on_consumed = getattr(self.response, "on_consumed", None)
+            if on_consumed is not None:
+                on_consumed(self.bytes_read)
+
+    def __iter_array(self, pos: int):
+        pos = self.__expect(pos, b"[")
+        while True:
+            pos, char = self.__skip_whitespace(pos)
+            if char == b"]":
+                return pos + 1
+            if char == b",":
+                pos, char = self.__skip_whitespace(pos + 1)
+
+            end = self.__value_end(pos)
+            item = loads(bytes(self.buffer[pos:end]))
+            # 丟棄已解析的部分，緩衝區只保留尚未處理的資料
+            del self.buffer[:end]
+            pos = 0
+            yield item
+
+    def __fill(self) -> bool:
+        """讀取下一段資料，回應已結束時回傳 False"""
+        for chunk in self.chunks:
+            if chunk:
+                self.buffer += chunk
+                self.bytes_read += len(chunk)
+                return True
+        return False
+
+    def __skip_whitespace(self, pos: int):
+        while True:
+            while pos < len(self.buffer) and self.buffer[pos] in WHITESPACE:
+                pos += 1
+            if pos < len(self.buffer):
+                return pos, self.buffer[pos:pos + 1]
+            if not self.__fill():
+                raise ValueError("回應在 JSON 解析完成前結束")
+
+    def __expect(self, pos: int, token: bytes) -> int:
+        pos, char = self.__skip_whitespace(pos)
+        if char != token:
+            raise ValueError(f"JSON 格式錯誤：預期 {token.decode()}，實際為 {char.decode(errors='replace')}")
+        return pos + 1
+
+    def __value_end(self, start: int) -> int:
+        """找出從 start 開始的一個 JSON 值的結束位置，資料不足時繼續讀取"""
+        first = self.buffer[start:start + 1]
+        if first not in (b"{", b"[", b'"'):
+            pos = start
+            while True:
+                match = SCALAR_END.search(self.buffer, pos)
+                if match:
+                    return match.start()
+                pos = len(self.buffer)
+                if not self.__fill():
+                    return pos
+
+        depth = 0
+        in_string = False
+        pos = start
+        while True:
+            match = (STRING_SPECIAL if in_string else STRUCTURAL).search(self.buffer, pos)
+            if match is None:
+                pos = len(self.buffer)
+                if not self.__fill():
+                    raise ValueError("回應在 JSON 值中途結束")
+                continue
+
+            char = self.buffer[match.start()]
+            pos = match.end()
+            if in_string:
+                if char == ord("\\"):
+                    # 跳過被跳脫的字元；跳脫字元剛好在緩衝區結尾時先讀取更多資料
+                    if pos >= len(self.buffer) and not self.__fill():
+                        raise ValueError("回應在 JSON 值中途結束")
+                    pos += 1
+                else:
+                    in_string = False
+                    if depth == 0:
+                        return pos
+            elif char == ord('"'):
+                in_string = True
+            elif char in b"[{":
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    return pos
+
+
+def read_results(response, decoder=None):
+    """以 ResultStream 讀完一頁回應，回傳 (results, metadata)；decoder 在解析每筆時立即套用"""
+    stream = ResultStream(response)
+    results = [item if decoder is None else decoder(item) for item in stream]
+    return results, stream.metadata
@@ -0,0 +1,109 @@
+ACCOUNTS = ["Paul", "Lily", "現金", "銀行存款"]
+
+# 帳本報表實際用到的屬性，查詢時以 filter_properties 只取回這些屬性
+LEDGER_PROPERTIES = ["時間", "分類", *ACCOUNTS]
+
+
+def read_category(result) -> str:
+    """取出帳本記錄的分類，未分類時回傳 None"""
+    select = result["properties"]["分類"]["select"]
+    return select["name"] if select else None
+
+
+def read_amounts(result) -> dict:
+    """取出帳本記錄各帳戶的金額，空值視為 0"""
+    properties = result["properties"]
+    return {account: properties[account]["number"] or 0 for account in ACCOUNTS}
+
+
+class LedgerEntry:
+    """精簡的帳本記錄，只保留時間、分類與各帳戶金額
+
+    以 __slots__ 取代完整的 Notion 頁面 dict，大量記錄時佔用的記憶體少一個數量級。
+    """
+
+    __slots__ = ("time", "category", "paul", "lily", "cash", "bank")
+
+    def __init__(self, time: str, category: str, paul=0, lily=0, cash=0, bank=0):
+        self.time = time
+        self.category = category
+        self.paul = paul
+        self.lily = lily
+        self.cash = cash
+        self.bank = bank
+
+    @classmethod
+    def from_page(cls, page: dict):
+        """由 Notion 帳本頁面（可為 filter_properties 投影後的結果）建立記錄"""
+        date = page["properties"]["時間"]["date"]
+        return cls(date["start"] if date else None, read_category(page), *read_amounts(page).values())
+
+    def amounts(self) -> dict:
+        """各帳戶的金額，順序同 ACCOUNTS"""
+        return dict(zip(ACCOUNTS, (self.paul, self.lily, self.cash, self.bank)))
+
+    def __repr__(self):
+        return f"LedgerEntry({self.time!r}, {self.category!r}, {self.paul}, {self.lily}, {self.cash}, {self.bank})"
+
+
+class CategoryTotals:
+    """指定分類的總額（各帳戶加總），例如圓餅圖"""
+
+    def __init__(self, categories: list):
+        self.totals = dict.fromkeys(categories, 0)
+
+    def add(self, entry, category: str, amounts: dict):
+        if category in self.totals:
+            self.totals[category] += sum(amounts.values())
+
+    def result(self) -> dict:
+        return self.totals
+
+
+class AccountTotals:
+    """所有交易在各帳戶的總和，例如開帳關帳"""
+
+    def __init__(self):
+        self.totals = dict.fromkeys(ACCOUNTS, 0)
+
+    def add(self, entry, category: str, amounts: dict):
+        for account, amount in amounts.items():
+            self.totals[account] += amount
+
+    def result(self) -> dict:
+        return self.totals
+
+
+class GroupedTotals:
+    """依自訂 key(entry, category) 分組的各帳戶總和，用來加入額外的分析"""
+
+    def __init__(self, key):
+        self.key = key
+        self.totals = {}
+
+    def add(self, entry, category: str, amounts: dict):
+        group = self.totals.setdefault(self.key(entry, category), dict.fromkeys(ACCOUNTS, 0))
+        for account, amount in amounts.items():
+            group[account] += amount
+
+    def result(self) -> dict:
+        return self.totals
+
+
+class LedgerAggregator:
+    """單次掃描帳本記錄，同時計算多份報表，新增報表不需要額外查詢"""
+
+    def __init__(self, reports: dict):
+        self.reports = reports
+
+    def add(self, entry: LedgerEntry):
+        category = entry.category
+        amounts = entry.amounts()
+
+        for report in self.reports.values():
+            report.add(entry, category, amounts)
+
+        return category, amounts
+
+    def results(self) -> dict:
+        return {name: report.result() for name, report in self.reports.items()}
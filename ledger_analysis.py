@@ -1,166 +1,257 @@
-from notion_api import NotionApi
+from notion_api import AsyncNotionApi
+from ledger_aggregator import LedgerAggregator, CategoryTotals, AccountTotals, GroupedTotals, LEDGER_PROPERTIES, LedgerEntry
+from ledger_mirror import LedgerMirror
+from ledger_summary import LedgerSummary, format_amount
+from page_writer import BulkPageWriter, PageWrite
+from metrics import RequestMetrics
+import argparse
+import asyncio
 import datetime
 import calendar
 import os
 
 
-notion_secret = os.getenv('NOTION_SECRET')
-if not notion_secret:
-    raise ValueError("請設定 NOTION_SECRET 環境變數")
-notion_api = NotionApi(notion_secret)
-
-today = datetime.date.today()
-
-# 計算上個月
-if today.month == 1:
-    last_month_year = today.year - 1
-    last_month = 12
-else:
-    last_month_year = today.year
-    last_month = today.month - 1
-
-first_day_of_last_month = datetime.date(last_month_year, last_month, 1)
-month_range = calendar.monthrange(first_day_of_last_month.year, first_day_of_last_month.month)[1]
-last_day_of_last_month = first_day_of_last_month + datetime.timedelta(days=month_range-1)
-
-# 計算時間區間：起始時間為上個月第一天減一秒，終止時間為上個月最後一天的最後一秒
-start_datetime = datetime.datetime.combine(first_day_of_last_month, datetime.time.min) - datetime.timedelta(seconds=1)
-end_datetime = datetime.datetime.combine(last_day_of_last_month, datetime.time.max)
-
-# 下個月（實際上是這個月）
-next_month_year = today.year
-next_month = today.month
-
-print(start_datetime)
-print(end_datetime)
-
-# 圓餅圖分析用的查詢（特定分類）
-filter_body_chart = {
-    "filter": {
-        "and": [
-            {
-                "property": "時間",
-                "date": {
-                    "after": start_datetime.isoformat()
-                }
-            },
-            {
-                "property": "時間",
-                "date": {
-                    "before": end_datetime.isoformat()
+ledger_database_id = '43c59e00321e49a69d85037f0f45ba7e'
+result_database_id = '25c8303f78f780fd9227e5e9d54c6b43'
+
+# 圓餅圖分析的分類
+CHART_CATEGORIES = ["娛樂", "飲食", "日常用品", "水電管理費"]
+
+
+def parse_month(value: str) -> datetime.date:
+    """YYYYMM 轉成該月第一天"""
+    try:
+        return datetime.datetime.strptime(value, "%Y%m").date()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"月份格式應為 YYYYMM: {value}")
+
+
+def next_month_of(first_day: datetime.date) -> datetime.date:
+    return (first_day + datetime.timedelta(days=32)).replace(day=1)
+
+
+def last_day_of(first_day: datetime.date) -> datetime.date:
+    return first_day.replace(day=calendar.monthrange(first_day.year, first_day.month)[1])
+
+
+def months_between(start_month: datetime.date, end_month: datetime.date) -> list:
+    """start_month 到 end_month（含）每個月的第一天"""
+    months = []
+    month = start_month
+    while month <= end_month:
+        months.append(month)
+        month = next_month_of(month)
+    return months
+
+
+def trend_start_of(first_day: datetime.date, trend: int) -> datetime.date:
+    """包含 first_day 在內最近 trend 個月的第一個月"""
+    for _ in range(trend - 1):
+        first_day = (first_day - datetime.timedelta(days=1)).replace(day=1)
+    return first_day
+
+
+def create_async_notion_api(request_hooks: list = None) -> AsyncNotionApi:
+    notion_secret = os.getenv('NOTION_SECRET')
+    if not notion_secret:
+        raise ValueError("請設定 NOTION_SECRET 環境變數")
+
+    return AsyncNotionApi(
+        notion_secret,
+        schema_cache_path='.cache/notion_schema.json',
+        request_hooks=request_hooks
+    )
+
+
+def build_filter(first_day: datetime.date, last_day: datetime.date) -> dict:
+    """first_day 到 last_day 所有交易的查詢（圓餅圖與開帳關帳共用同一次掃描，再依月份分組）"""
+    # 計算時間區間：起始時間為第一天減一秒，終止時間為最後一天的最後一秒
+    start_datetime = datetime.datetime.combine(first_day, datetime.time.min) - datetime.timedelta(seconds=1)
+    end_datetime = datetime.datetime.combine(last_day, datetime.time.max)
+
+    print(start_datetime)
+    print(end_datetime)
+
+    return {
+        "filter": {
+            "and": [
+                {
+                    "property": "時間",
+                    "date": {
+                        "after": start_datetime.isoformat()
+                    }
+                },
+                {
+                    "property": "時間",
+                    "date": {
+                        "before": end_datetime.isoformat()
+                    }
                 }
-            },
-            {
-                "or": [
-                    {
-                        "property": "分類",
-                        "select": {
-                            "equals": "娛樂"
-                        }
-                    },
-                    {
-                        "property": "分類",
-                        "select": {
-                            "equals": "飲食"
-                        }
-                    },
-                    {
-                        "property": "分類",
-                        "select": {
-                            "equals": "日常用品"
-                        }
-                    },
-                    {
-                        "property": "分類",
-                        "select": {
-                            "equals": "水電管理費"
-                        }
+            ]
+        }
+    }
+
+
+def build_aggregator():
+    """每個月要產生的所有報表，皆由同一次掃描計算"""
+    return LedgerAggregator({
+        "chart": CategoryTotals(CHART_CATEGORIES),
+        "accounts": AccountTotals(),
+        "by_category": GroupedTotals(lambda entry, category: category)
+    })
+
+
+def build_aggregators(months: list) -> dict:
+    return {month.strftime("%Y-%m"): build_aggregator() for month in months}
+
+
+def month_key_of(time_value: str) -> str:
+    """「時間」屬性所屬的月份 YYYY-MM
+
+    與 build_filter 的時間區間採用相同的比較方式：含時區的時間先換算成 UTC，
+    例如 2026-10-01T05:00+08:00 屬於 2026-09。
+    """
+    moment = datetime.datetime.fromisoformat(time_value.replace("Z", "+00:00"))
+    if moment.tzinfo:
+        moment = moment.astimezone(datetime.timezone.utc)
+    return moment.strftime("%Y-%m")
+
+
+def add_to_aggregator(aggregators, entry: LedgerEntry) -> bool:
+    """依記錄的「時間」送入所屬月份的彙總器，不屬於任何要求的月份時回傳 False"""
+    aggregator = aggregators.get(month_key_of(entry.time)) if entry.time else None
+    if aggregator is None:
+        print(f"略過不在查詢月份內的帳本記錄: {entry}")
+        return False
+
+    catalog, amounts = aggregator.add(entry)
+    print(f"帳本數據 - {catalog}: (paul: {amounts['Paul']}), (lily: {amounts['Lily']}), "
+          f"(cash: {amounts['現金']}), (bank: {amounts['銀行存款']})")
+    return True
+
+
+def print_skipped(skipped: int):
+    if skipped:
+        print(f"共略過 {skipped} 筆不在查詢月份內的帳本記錄")
+
+
+def summarize_from_mirror(notion_api, mirror_path: str, months: list):
+    """先增量同步本機鏡像（並比對區間內已刪除的記錄），再從鏡像讀取區間內的交易"""
+    aggregators = build_aggregators(months)
+    mirror = LedgerMirror(mirror_path, ledger_database_id)
+    skipped = 0
+    try:
+        mirror.sync(notion_api, months[0], last_day_of(months[-1]))
+        for entry in mirror.rows_between(months[0], last_day_of(months[-1])):
+            skipped += not add_to_aggregator(aggregators, entry)
+    finally:
+        mirror.close()
+
+    print_skipped(skipped)
+    return [aggregator.results() for aggregator in aggregators.values()]
+
+
+async def summarize_months(async_notion_api: AsyncNotionApi, months: list):
+    """串流區間內的交易，逐筆送入所屬月份的彙總器；設定 LEDGER_MIRROR 時改從本機鏡像讀取
+
+    回傳與 months 對應的每月報表。
+    """
+    mirror_path = os.getenv('LEDGER_MIRROR')
+    if mirror_path:
+        return await asyncio.to_thread(summarize_from_mirror, async_notion_api.api, mirror_path, months)
+
+    filter_body = build_filter(months[0], last_day_of(months[-1]))
+    aggregators = build_aggregators(months)
+    skipped = 0
+    # 只取回報表用到的屬性，邊接收邊解析並逐筆轉成精簡的 LedgerEntry
+    async for entry in async_notion_api.iter_query(ledger_database_id, filter_body,
+                                                   filter_properties=LEDGER_PROPERTIES,
+                                                   decoder=LedgerEntry.from_page, stream=True):
+        skipped += not add_to_aggregator(aggregators, entry)
+
+    print_skipped(skipped)
+    return [aggregator.results() for aggregator in aggregators.values()]
+
+
+async def fetch_months(async_notion_api: AsyncNotionApi, months: list):
+    """區間查詢與兩個資料庫的屬性偵測同時進行
+
+    投影查詢（filter_properties）與屬性偵測都需要帳本的屬性結構，先取得兩個資料庫的屬性結構各一次，
+    避免同時進行的呼叫都錯過快取而重複取得。
+    """
+    await asyncio.gather(
+        async_notion_api.get_database_schema(ledger_database_id),
+        async_notion_api.get_database_schema(result_database_id)
+    )
+    return await asyncio.gather(
+        summarize_months(async_notion_api, months),
+        async_notion_api.get_property_names_by_type(result_database_id, ['title', 'rich_text']),
+        async_notion_api.get_property_names_by_type(ledger_database_id, ['title'])
+    )
+
+
+def settlement_properties(title_property: str, title: str, totals: dict, sign: int) -> dict:
+    """關帳（sign=-1，沖銷歸零）或開帳（sign=1）記錄的屬性"""
+    properties = {
+        title_property: {
+            "title": [
+                {
+                    "text": {
+                        "content": title
                     }
-                ],
+                }
+            ]
+        },
+        "分類": {
+            "select": {
+                "name": "財務整理"
             }
-        ]
+        }
     }
-}
-
-# 開帳關帳用的查詢（所有交易）
-filter_body_all = {
-    "filter": {
-        "and": [
-            {
-                "property": "時間",
-                "date": {
-                    "after": start_datetime.isoformat()
-                }
-            },
-            {
-                "property": "時間",
-                "date": {
-                    "before": end_datetime.isoformat()
+    for account, amount in totals.items():
+        properties[account] = {
+            "number": sign * amount
+        }
+    return properties
+
+
+def mermaid_code_block(content: str) -> dict:
+    return {
+        "object": "block",
+        "type": "code",
+        "code": {
+            "rich_text": [
+                {
+                    "type": "text",
+                    "text": {
+                        "content": content
+                    }
                 }
-            }
-        ]
+            ],
+            "language": "mermaid"
+        }
     }
-}
-
-# 查詢圓餅圖數據
-response_chart = notion_api.query_database('43c59e00321e49a69d85037f0f45ba7e', filter_body_chart)
-results_chart = response_chart.json()["results"]
-
-# 查詢所有交易數據
-response_all = notion_api.query_database('43c59e00321e49a69d85037f0f45ba7e', filter_body_all)
-results_all = response_all.json()["results"]
-#print(results)
-
-# 圓餅圖分析數據統計
-entertainment = 0
-bill = 0
-food = 0
-sundries = 0
-
-for result in results_chart:
-    catalog = result["properties"]["分類"]["select"]["name"]
-
-    paul = 0 if result["properties"]["Paul"]["number"] is None else result["properties"]["Paul"]["number"]
-    lily = 0 if result["properties"]["Lily"]["number"] is None else result["properties"]["Lily"]["number"]
-    cash = 0 if result["properties"]["現金"]["number"] is None else result["properties"]["現金"]["number"]
-    bank = 0 if result["properties"]["銀行存款"]["number"] is None else result["properties"]["銀行存款"]["number"]
-    
-    print(f"圓餅圖數據 - {catalog}: (paul: {paul}), (lily: {lily}), (cash: {cash}), (bank: {bank})")
-    if catalog == "水電管理費":
-        bill += paul + lily + cash + bank
-    if catalog == "娛樂":
-        entertainment += paul + lily + cash + bank
-    if catalog == "飲食":
-        food += paul + lily + cash + bank
-    if catalog == "日常用品":
-        sundries += paul + lily + cash + bank
-
-# 開帳關帳統計（所有交易的總和）
-total_paul = 0
-total_lily = 0
-total_cash = 0
-total_bank = 0
-
-for result in results_all:
-    catalog = result["properties"]["分類"]["select"]["name"]
-
-    paul = 0 if result["properties"]["Paul"]["number"] is None else result["properties"]["Paul"]["number"]
-    lily = 0 if result["properties"]["Lily"]["number"] is None else result["properties"]["Lily"]["number"]
-    cash = 0 if result["properties"]["現金"]["number"] is None else result["properties"]["現金"]["number"]
-    bank = 0 if result["properties"]["銀行存款"]["number"] is None else result["properties"]["銀行存款"]["number"]
-    
-    # 累計所有交易的總和
-    total_paul += paul
-    total_lily += lily
-    total_cash += cash
-    total_bank += bank
-    
-    print(f"開帳關帳數據 - {catalog}: (paul: {paul}), (lily: {lily}), (cash: {cash}), (bank: {bank})")
-
-total = entertainment + bill + food + sundries
-
-title = first_day_of_last_month.strftime("%Y%m")
-mermaid_content = f"""%%{{init: {{'theme': 'base', 'themeVariables': {{ 'pie1': '#FF0000', 'pie2': '#FFFF00', 'pie3': '#00FF00', 'pie4': '#0000FF', 'pie5': '#800080', 'pie6': '#ff0000', 'pie7': '#FFA500'}}}}}}%%
+
+
+def month_operations(first_day: datetime.date, reports: dict, result_props: dict, ledger_props: dict,
+                     trend_content: str = None) -> list:
+    """一個月的分析結果頁面、關帳與下月開帳記錄"""
+    title = first_day.strftime("%Y%m")
+    close_title = f"{title} 關帳"
+    next_month_title = f"{next_month_of(first_day).strftime('%Y%m')} 開帳"
+
+    chart_totals = reports["chart"]
+    entertainment = chart_totals["娛樂"]
+    bill = chart_totals["水電管理費"]
+    food = chart_totals["飲食"]
+    sundries = chart_totals["日常用品"]
+
+    for category, amounts in reports["by_category"].items():
+        print(f"分類總額 - {category}: {sum(amounts.values())}")
+
+    total = entertainment + bill + food + sundries
+
+    mermaid_content = f"""%%{{init: {{'theme': 'base', 'themeVariables': {{ 'pie1': '#FF0000', 'pie2': '#FFFF00', 'pie3': '#00FF00', 'pie4': '#0000FF', 'pie5': '#800080', 'pie6': '#ff0000', 'pie7': '#FFA500'}}}}}}%%
 pie showData
         title {title} 分析 - 總額: {-total}
         "娛樂" : {-entertainment}
@@ -168,155 +259,160 @@ pie showData
         "飲食" : {-food}
         "水電管理費" : {-bill}"""
 
-print(f"{mermaid_content}")
+    print(f"{mermaid_content}")
 
-# 自動偵測結果資料庫的屬性名稱
-result_database_id = '25c8303f78f780fd9227e5e9d54c6b43'
-result_props = notion_api.get_property_names_by_type(result_database_id, ['title', 'rich_text'])
-
-# 創建 Notion 頁面的屬性
-page_properties = {
-    result_props['title']: {
-        "title": [
-            {
-                "text": {
-                    "content": title
-                }
-            }
-        ]
-    }
-}
-
-# 檢查分析結果頁面是否已存在
-if notion_api.check_record_exists(result_database_id, result_props['title'], title):
-    print(f"分析結果頁面 '{title}' 已存在，跳過創建")
-else:
-    # 創建新的 Notion 頁面
-    create_response = notion_api.create_page(result_database_id, page_properties)
-
-    if create_response.status_code == 200:
-        page_id = create_response.json()['id']
-        print(f"成功創建 Notion 頁面: {title}, ID: {page_id}")
-        
-        # 建立 Mermaid code block 內容
-        mermaid_block = {
-            "object": "block",
-            "type": "code",
-            "code": {
-                "rich_text": [
-                    {
-                        "type": "text",
-                        "text": {
-                            "content": mermaid_content
-                        }
+    # 創建 Notion 頁面的屬性
+    page_properties = {
+        result_props['title']: {
+            "title": [
+                {
+                    "text": {
+                        "content": title
                     }
-                ],
-                "language": "mermaid"
-            }
-        }
-        
-        # 將 Mermaid 圖表加入頁面
-        block_response = notion_api.append_block_children(page_id, [mermaid_block])
-        
-        if block_response.status_code == 200:
-            print(f"成功加入 Mermaid 圖表到頁面")
-        else:
-            print(f"加入 Mermaid 圖表失敗: {block_response.status_code}")
-            print(block_response.text)
-    else:
-        print(f"創建 Notion 頁面失敗: {create_response.status_code}")
-        print(create_response.text)
-
-# 自動偵測帳本資料庫的屬性名稱
-ledger_database_id = '43c59e00321e49a69d85037f0f45ba7e'
-ledger_props = notion_api.get_property_names_by_type(ledger_database_id, ['title'])
-
-# 創建關帳記錄（沖銷歸零）
-close_title = f"{title} 關帳"
-close_properties = {
-    ledger_props['title']: {
-        "title": [
-            {
-                "text": {
-                    "content": close_title
-                }
-            }
-        ]
-    },
-    "分類": {
-        "select": {
-            "name": "財務整理"
-        }
-    },
-    "Paul": {
-        "number": -total_paul
-    },
-    "Lily": {
-        "number": -total_lily
-    },
-    "現金": {
-        "number": -total_cash
-    },
-    "銀行存款": {
-        "number": -total_bank
-    }
-}
-
-# 創建開帳記錄（下月開帳）
-next_month_title = f"{next_month_year}{next_month:02d} 開帳"
-open_properties = {
-    ledger_props['title']: {
-        "title": [
-            {
-                "text": {
-                    "content": next_month_title
                 }
-            }
-        ]
-    },
-    "分類": {
-        "select": {
-            "name": "財務整理"
+            ]
         }
-    },
-    "Paul": {
-        "number": total_paul
-    },
-    "Lily": {
-        "number": total_lily
-    },
-    "現金": {
-        "number": total_cash
-    },
-    "銀行存款": {
-        "number": total_bank
     }
-}
-
-# 檢查關帳記錄是否已存在
-if notion_api.check_record_exists(ledger_database_id, ledger_props['title'], close_title):
-    print(f"關帳記錄 '{close_title}' 已存在，跳過創建")
-else:
-    # 創建關帳記錄
-    close_response = notion_api.create_page(ledger_database_id, close_properties)
-    if close_response.status_code == 200:
-        print(f"成功創建關帳記錄: {close_title}")
-    else:
-        print(f"創建關帳記錄失敗: {close_response.status_code}")
-        print(close_response.text)
-
-# 檢查開帳記錄是否已存在
-if notion_api.check_record_exists(ledger_database_id, ledger_props['title'], next_month_title):
-    print(f"開帳記錄 '{next_month_title}' 已存在，跳過創建")
-else:
-    # 創建開帳記錄
-    open_response = notion_api.create_page(ledger_database_id, open_properties)
-    if open_response.status_code == 200:
-        print(f"成功創建開帳記錄: {next_month_title}")
-    else:
-        print(f"創建開帳記錄失敗: {open_response.status_code}")
-        print(open_response.text)
-
-print(f"當月各項總額 - Paul: {total_paul}, Lily: {total_lily}, 現金: {total_cash}, 銀行存款: {total_bank}")
-print(f"關帳金額 - Paul: {-total_paul}, Lily: {-total_lily}, 現金: {-total_cash}, 銀行存款: {-total_bank}")
-print(f"開帳金額 - Paul: {total_paul}, Lily: {total_lily}, 現金: {total_cash}, 銀行存款: {total_bank}")
\ No newline at end of file
+
+    # 建立 Mermaid code block 內容，與分析結果頁面一起建立
+    children = [mermaid_code_block(mermaid_content)]
+    if trend_content:
+        print(trend_content)
+        children.append(mermaid_code_block(trend_content))
+
+    account_totals = reports["accounts"]
+    close_properties = settlement_properties(ledger_props['title'], close_title, account_totals, -1)
+    open_properties = settlement_properties(ledger_props['title'], next_month_title, account_totals, 1)
+
+    return [
+        PageWrite(f"{result_database_id}:{title}", result_database_id, page_properties, children,
+                  title_property=result_props['title'], title=title),
+        PageWrite(f"{ledger_database_id}:{close_title}", ledger_database_id, close_properties,
+                  title_property=ledger_props['title'], title=close_title),
+        PageWrite(f"{ledger_database_id}:{next_month_title}", ledger_database_id, open_properties,
+                  title_property=ledger_props['title'], title=next_month_title)
+    ]
+
+
+async def analyze(async_notion_api: AsyncNotionApi, months: list, trend: int = 0, ytd: bool = False) -> list:
+    # 每月關帳時更新每月總額索引，趨勢與年初至今的報表不需重新掃描原始交易
+    ledger_summary = LedgerSummary('.cache/ledger_summary.sqlite')
+    try:
+        # 索引在 .cache 中，可能被清除或缺少部分月份；只有趨勢圖（trend）或指定 ytd 時，
+        # 才把報表用到但索引中沒有的月份放進同一次帳本掃描補上，避免每次都掃描整年的交易
+        backfill = []
+        if trend > 0 or ytd:
+            report_start = months[0].replace(month=1) if ytd else months[0]
+            report_start = min(report_start, trend_start_of(months[0], trend))
+            backfill = [
+                month for month in ledger_summary.missing_months(report_start, months[-1]) if month not in months
+            ]
+        if backfill:
+            print(f"每月總額索引缺少 {len(backfill)} 個月，從帳本補上: "
+                  + ", ".join(month.strftime('%Y%m') for month in backfill))
+
+        # 掃描連續的月份區間，區間內已在索引中的月份一併更新，不會有查詢到卻不屬於任何月份的記錄
+        scan_months = months_between(min([*backfill, months[0]]), months[-1])
+        scanned_reports, result_props, ledger_props = await fetch_months(async_notion_api, scan_months)
+        for first_day, reports in zip(scan_months, scanned_reports):
+            ledger_summary.store_month(first_day, reports["by_category"])
+        monthly_reports = [scanned_reports[scan_months.index(first_day)] for first_day in months]
+
+        operations = []
+        for first_day, reports in zip(months, monthly_reports):
+            trend_content = None
+            if trend > 0:
+                trend_content = ledger_summary.trend_mermaid(
+                    CHART_CATEGORIES, trend_start_of(first_day, trend), first_day
+                )
+
+            operations.extend(month_operations(first_day, reports, result_props, ledger_props, trend_content))
+
+            # 年初至今只加總索引中已有的月份，並列出缺少的月份
+            year_to_date = ledger_summary.year_to_date(first_day)
+            missing = ledger_summary.missing_months(first_day.replace(month=1), first_day)
+            print(f"{first_day.year} 年初至今 - " + ", ".join(
+                f"{category}: {format_amount(year_to_date.get(category, 0))}" for category in CHART_CATEGORIES
+            ) + (f"（索引缺少 {', '.join(month.strftime('%Y%m') for month in missing)}，未計入；"
+                 f"加上 --ytd 從帳本補上）" if missing else ""))
+    finally:
+        ledger_summary.close()
+
+    # 同時建立所有月份的分析結果頁面、關帳與開帳記錄；已完成的操作記錄在日誌中，重新執行時不會重複建立
+    page_writer = BulkPageWriter(async_notion_api, '.cache/ledger_journal.jsonl')
+    await page_writer.write(operations)
+
+    for first_day, reports in zip(months, monthly_reports):
+        totals = reports["accounts"]
+        total_paul = totals["Paul"]
+        total_lily = totals["Lily"]
+        total_cash = totals["現金"]
+        total_bank = totals["銀行存款"]
+
+        if len(months) > 1:
+            print(f"{first_day.strftime('%Y%m')}:")
+        print(f"當月各項總額 - Paul: {total_paul}, Lily: {total_lily}, 現金: {total_cash}, 銀行存款: {total_bank}")
+        print(f"關帳金額 - Paul: {-total_paul}, Lily: {-total_lily}, 現金: {-total_cash}, 銀行存款: {-total_bank}")
+        print(f"開帳金額 - Paul: {total_paul}, Lily: {total_lily}, 現金: {total_cash}, 銀行存款: {total_bank}")
+
+    return monthly_reports
+
+
+def run(from_month: datetime.date = None, to_month: datetime.date = None, trend: int = 0,
+        async_notion_api: AsyncNotionApi = None, scheduled_at: datetime.datetime = None,
+        last_success: datetime.datetime = None, ytd: bool = False) -> list:
+    """分析 from_month 到 to_month（含）每個月的帳本，建立分析結果頁面與關帳、開帳記錄，回傳每月報表
+
+    未指定月份時處理 scheduled_at（預設今天）的上個月；由 job_runner 執行時另外傳入上次成功的排程時間
+    last_success，補上之後錯過或失敗的月份。可由 job_runner 傳入共用的 async_notion_api，未提供時自行建立。
+    ytd 為 True 時，年初至今總額在每月總額索引中缺少的月份一併從帳本補上。
+    """
+    today = scheduled_at.date() if scheduled_at else datetime.date.today()
+    last_month = (today.replace(day=1) - datetime.timedelta(days=1)).replace(day=1)
+    if from_month is None and to_month is None and last_success is not None:
+        # 上次成功的排程處理的是它的前一個月，從該排程所在的月份開始補
+        from_month = min(last_success.date().replace(day=1), last_month)
+        to_month = last_month
+    from_month = from_month or to_month or last_month
+    to_month = to_month or from_month
+    if from_month > to_month:
+        raise ValueError("起始月份不可晚於結束月份")
+    months = months_between(from_month, to_month)
+
+    if async_notion_api is not None:
+        return asyncio.run(analyze(async_notion_api, months, trend, ytd))
+
+    async_notion_api = create_async_notion_api()
+    try:
+        return asyncio.run(analyze(async_notion_api, months, trend, ytd))
+    finally:
+        async_notion_api.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="分析帳本並建立分析結果、關帳與開帳記錄，預設處理上個月")
+    parser.add_argument("--from", dest="from_month", type=parse_month, metavar="YYYYMM", help="回補區間的起始月份")
+    parser.add_argument("--to", dest="to_month", type=parse_month, metavar="YYYYMM", help="回補區間的結束月份（含），預設與 --from 相同")
+    parser.add_argument("--trend", type=int, default=0, metavar="MONTHS",
+                        help="在分析結果頁面加上最近 MONTHS 個月的分類趨勢圖（由每月總額索引計算，索引缺少的月份從帳本補上）")
+    parser.add_argument("--ytd", action="store_true",
+                        help="年初至今總額缺少的月份從帳本補上（預設只加總索引中已有的月份）")
+    args = parser.parse_args()
+    if args.from_month and args.to_month and args.from_month > args.to_month:
+        parser.error("--from 不可晚於 --to")
+
+    # 請求指標，設定 METRICS_PATH 時於結束時輸出（.prom 為 Prometheus 格式，其餘為 JSON）
+    request_metrics = RequestMetrics()
+    async_notion_api = create_async_notion_api([request_metrics.record])
+    try:
+        run(args.from_month, args.to_month, args.trend, async_notion_api, ytd=args.ytd)
+    finally:
+        async_notion_api.close()
+
+    print(request_metrics.summary())
+    if os.getenv('METRICS_PATH'):
+        request_metrics.dump(os.getenv('METRICS_PATH'))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+import datetime
+import os
+import sys
+
+import numpy as np
+
+from ledger_aggregator import ACCOUNTS, LEDGER_PROPERTIES, LedgerEntry
+
+
+class LedgerColumns:
+    """帳本記錄的欄式表示，讓多個月份的分組加總以向量化方式計算
+
+    - dates: datetime64[D] 陣列（無日期為 NaT）
+    - category_codes: 分類代碼陣列，對應 categories 中的名稱
+    - amounts: (筆數, 帳戶數) 的 float64 矩陣，欄位順序同 ACCOUNTS
+    """
+
+    def __init__(self, dates, category_codes, categories: list, amounts):
+        self.dates = dates
+        self.category_codes = category_codes
+        self.categories = categories
+        self.amounts = amounts
+
+    @classmethod
+    def from_rows(cls, rows):
+        """將 LedgerEntry（可為串流產生器）轉換成欄式陣列"""
+        dates = []
+        codes = []
+        amounts = []
+        category_index = {}
+
+        for entry in rows:
+            dates.append(entry.time[:10] if entry.time else "NaT")
+            codes.append(category_index.setdefault(entry.category, len(category_index)))
+            amounts.append((entry.paul, entry.lily, entry.cash, entry.bank))
+
+        return cls(
+            np.array(dates, dtype="datetime64[D]"),
+            np.array(codes, dtype=np.int32),
+            list(category_index),
+            np.array(amounts, dtype=np.float64).reshape(-1, len(ACCOUNTS))
+        )
+
+    def __len__(self):
+        return len(self.dates)
+
+    @property
+    def months(self):
+        return self.dates.astype("datetime64[M]")
+
+    def account(self, name: str):
+        """單一帳戶的金額陣列"""
+        return self.amounts[:, ACCOUNTS.index(name)]
+
+    def between(self, start: datetime.date, end: datetime.date):
+        """取出日期介於 start 與 end（含）之間的記錄"""
+        mask = (self.dates >= np.datetime64(start, "D")) & (self.dates <= np.datetime64(end, "D"))
+        return LedgerColumns(self.dates[mask], self.category_codes[mask], self.categories, self.amounts[mask])
+
+    def sum_by_account(self) -> dict:
+        totals = self.amounts.sum(axis=0)
+        return dict(zip(ACCOUNTS, totals.tolist()))
+
+    def sum_by_category(self):
+        """回傳 (分類名稱, 各帳戶總額矩陣)"""
+        totals = self.__group_sum(self.category_codes, len(self.categories))
+        return list(self.categories), totals
+
+    def sum_by_month(self):
+        """回傳 (月份陣列, 各帳戶總額矩陣)，無日期的記錄不列入"""
+        valid = ~np.isnat(self.dates)
+        months, inverse = np.unique(self.months[valid], return_inverse=True)
+        return months, self.__group_sum(inverse, len(months), valid)
+
+    def sum_by_month_and_category(self):
+        """回傳 (月份陣列, 分類名稱, (月份數, 分類數, 帳戶數) 總額陣列)"""
+        valid = ~np.isnat(self.dates)
+        months, month_codes = np.unique(self.months[valid], return_inverse=True)
+        category_count = len(self.categories)
+
+        keys = month_codes * category_count + self.category_codes[valid]
+        totals = self.__group_sum(keys, len(months) * category_count, valid)
+        return months, list(self.categories), totals.reshape(len(months), category_count, len(ACCOUNTS))
+
+    def __group_sum(self, keys, group_count: int, mask=None):
+        amounts = self.amounts if mask is None else self.amounts[mask]
+        return np.column_stack([
+            np.bincount(keys, weights=amounts[:, i], minlength=group_count) for i in range(len(ACCOUNTS))
+        ]).reshape(group_count, len(ACCOUNTS))
+
+
+def load_columns(notion_api, database_id: str, start: datetime.date, end: datetime.date) -> LedgerColumns:
+    """以分頁串流查詢日期區間內的帳本記錄並轉成欄式陣列"""
+    filter_body = {
+        "filter": {
+            "and": [
+                {
+                    "property": "時間",
+                    "date": {
+                        "on_or_after": start.isoformat()
+                    }
+                },
+                {
+                    "property": "時間",
+                    "date": {
+                        "on_or_before": end.isoformat()
+                    }
+                }
+            ]
+        }
+    }
+
+    return LedgerColumns.from_rows(notion_api.iter_query(
+        database_id, filter_body, filter_properties=LEDGER_PROPERTIES, decoder=LedgerEntry.from_page, stream=True
+    ))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("用法: python ledger_columnar.py <起始月份 YYYYMM> <結束月份 YYYYMM>")
+        sys.exit(1)
+
+    from notion_api import NotionApi
+
+    notion_secret = os.getenv('NOTION_SECRET')
+    if not notion_secret:
+        raise ValueError("請設定 NOTION_SECRET 環境變數")
+
+    start_month = datetime.datetime.strptime(sys.argv[1], "%Y%m").date()
+    end_month = np.datetime64(datetime.datetime.strptime(sys.argv[2], "%Y%m").date(), "M")
+    end_date = ((end_month + 1).astype("datetime64[D]") - 1).astype(datetime.date)
+
+    columns = load_columns(NotionApi(notion_secret), '43c59e00321e49a69d85037f0f45ba7e', start_month, end_date)
+    months, categories, totals = columns.sum_by_month_and_category()
+
+    for month_index, month in enumerate(months):
+        for category_index, category in enumerate(categories):
+            total = totals[month_index, category_index].sum()
+            if total:
+                print(f"{month} {category}: {total:g}")
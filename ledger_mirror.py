@@ -0,0 +1,145 @@
+import datetime
+import json
+import os
+import sqlite3
+
+from ledger_aggregator import LEDGER_PROPERTIES, LedgerEntry
+
+
+class LedgerMirror:
+    """帳本資料庫的本機 SQLite 鏡像
+
+    以 last_edited_time 增量同步，只抓取上次同步後有變動的記錄；
+    Notion 查詢不會回傳已刪除的頁面，因此每次同步時只比對要讀取的日期區間內的頁面 ID，移除已刪除的記錄，
+    不需重新下載整個帳本。
+    """
+
+    def __init__(self, path: str, database_id: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.database_id = database_id
+        self.db = sqlite3.connect(path)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS pages (
+                id TEXT PRIMARY KEY,
+                database_id TEXT NOT NULL,
+                time TEXT,
+                last_edited_time TEXT NOT NULL,
+                data TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS pages_time ON pages (database_id, time);
+            CREATE TABLE IF NOT EXISTS sync_state (
+                database_id TEXT PRIMARY KEY,
+                last_edited_time TEXT
+            );
+        """)
+
+    def close(self):
+        self.db.close()
+
+    def sync(self, notion_api, start: datetime.date, end: datetime.date) -> int:
+        """同步 Notion 的變動到鏡像，並確認 start 到 end（含）之間的記錄與 Notion 一致，回傳抓取的記錄數
+
+        鏡像是空的（第一次執行或快取被清除）時只抓取這段區間，不下載整個帳本。
+        """
+        watermark = self.__watermark()
+        # 保留一分鐘的重疊，避免本機與 Notion 的時間差漏掉同步期間的變動
+        synced_at = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(minutes=1)
+
+        count = 0
+        with self.db:
+            if watermark:
+                # last_edited_time 只精確到分鐘，用 on_or_after 重抓邊界上的記錄
+                count += self.__upsert_all(notion_api, {
+                    "filter": {
+                        "timestamp": "last_edited_time",
+                        "last_edited_time": {"on_or_after": watermark}
+                    }
+                })
+
+            count += self.__reconcile(notion_api, start, end, bootstrap=watermark is None)
+
+            self.db.execute(
+                "INSERT OR REPLACE INTO sync_state (database_id, last_edited_time) VALUES (?, ?)",
+                (self.database_id, synced_at.isoformat(timespec="seconds"))
+            )
+
+        print(f"帳本鏡像同步完成: {'區間' if watermark is None else '增量'}，取得 {count} 筆")
+        return count
+
+    def upsert(self, page: dict):
+        """寫入或更新一筆頁面，已封存 / 移至垃圾桶的頁面則刪除"""
+        if page.get("archived") or page.get("in_trash"):
+            self.db.execute("DELETE FROM pages WHERE id = ?", (page["id"],))
+            return
+
+        date = page["properties"].get("時間", {}).get("date")
+        self.db.execute(
+            "INSERT OR REPLACE INTO pages (id, database_id, time, last_edited_time, data) VALUES (?, ?, ?, ?, ?)",
+            (
+                page["id"],
+                self.database_id,
+                date["start"] if date else None,
+                page["last_edited_time"],
+                json.dumps(page, ensure_ascii=False)
+            )
+        )
+
+    def rows_between(self, start: datetime.date, end: datetime.date):
+        """依「時間」屬性取出 start 到 end（含）之間的記錄（LedgerEntry）"""
+        cursor = self.db.execute(
+            "SELECT data FROM pages WHERE database_id = ? AND time >= ? AND time < ? ORDER BY time",
+            (self.database_id, start.isoformat(), (end + datetime.timedelta(days=1)).isoformat())
+        )
+        for (data,) in cursor:
+            yield LedgerEntry.from_page(json.loads(data))
+
+    def __reconcile(self, notion_api, start: datetime.date, end: datetime.date, bootstrap: bool) -> int:
+        """比對區間內的頁面 ID：移除 Notion 上已刪除的記錄，有鏡像中沒有的記錄時重新抓取整個區間"""
+        body = {
+            "filter": {
+                "and": [
+                    {"property": "時間", "date": {"on_or_after": start.isoformat()}},
+                    {"property": "時間", "date": {"on_or_before": end.isoformat()}}
+                ]
+            }
+        }
+        local_ids = {
+            row[0] for row in self.db.execute(
+                "SELECT id FROM pages WHERE database_id = ? AND time >= ? AND time < ?",
+                (self.database_id, start.isoformat(), (end + datetime.timedelta(days=1)).isoformat())
+            )
+        }
+
+        if not bootstrap:
+            # 只取回「時間」屬性，用來比對 ID
+            remote_ids = {
+                page["id"] for page in
+                notion_api.iter_query(self.database_id, body, filter_properties=["時間"], stream=True)
+            }
+            self.db.executemany("DELETE FROM pages WHERE id = ?", [(page_id,) for page_id in local_ids - remote_ids])
+            if remote_ids <= local_ids:
+                return 0
+
+        seen = set()
+        count = self.__upsert_all(notion_api, body, seen)
+        self.db.executemany("DELETE FROM pages WHERE id = ?", [(page_id,) for page_id in local_ids - seen])
+        return count
+
+    def __upsert_all(self, notion_api, body: dict, seen: set = None) -> int:
+        count = 0
+        # 只取回報表用到的屬性，鏡像中保存的也是投影後的頁面
+        for page in notion_api.iter_query(self.database_id, body, filter_properties=LEDGER_PROPERTIES, stream=True):
+            self.upsert(page)
+            if seen is not None:
+                seen.add(page["id"])
+            count += 1
+        return count
+
+    def __watermark(self):
+        row = self.db.execute(
+            "SELECT last_edited_time FROM sync_state WHERE database_id = ?", (self.database_id,)
+        ).fetchone()
+        return row[0] if row else None
@@ -0,0 +1,194 @@
+import argparse
+import datetime
+import os
+import sqlite3
+
+from ledger_aggregator import ACCOUNTS
+
+
+class LedgerSummary:
+    """每月、每個分類、每個帳戶總額的本機 SQLite 索引
+
+    每個月關帳時由 ledger_analysis 寫入該月的分類總額，趨勢與年初至今的報表
+    直接從這張表計算，不需重新掃描原始交易。月份以 datetime.date（該月任一天）指定。
+    索引檔可能被清除或缺少部分月份，查詢前以 missing_months 確認，缺少的月份需先從帳本補上。
+    """
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.db = sqlite3.connect(path)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS monthly_totals (
+                month TEXT NOT NULL,
+                category TEXT NOT NULL,
+                account TEXT NOT NULL,
+                amount REAL NOT NULL,
+                PRIMARY KEY (month, category, account)
+            );
+            -- 已寫入的月份（沒有任何交易的月份在 monthly_totals 中沒有資料列）
+            CREATE TABLE IF NOT EXISTS stored_months (
+                month TEXT PRIMARY KEY
+            );
+            INSERT OR IGNORE INTO stored_months SELECT DISTINCT month FROM monthly_totals;
+        """)
+
+    def close(self):
+        self.db.close()
+
+    def store_month(self, month: datetime.date, by_category: dict):
+        """以 {分類: {帳戶: 金額}} 取代該月的總額（重新計算同一個月時覆蓋舊值）"""
+        key = month_key(month)
+        with self.db:
+            self.db.execute("DELETE FROM monthly_totals WHERE month = ?", (key,))
+            self.db.execute("INSERT OR IGNORE INTO stored_months (month) VALUES (?)", (key,))
+            self.db.executemany(
+                "INSERT INTO monthly_totals (month, category, account, amount) VALUES (?, ?, ?, ?)",
+                [
+                    # 未分類的記錄以空字串儲存
+                    (key, category or "", account, amount)
+                    for category, amounts in by_category.items()
+                    for account, amount in amounts.items()
+                ]
+            )
+
+    def months(self) -> list:
+        return [row[0] for row in self.db.execute("SELECT month FROM stored_months ORDER BY month")]
+
+    def missing_months(self, start: datetime.date, end: datetime.date) -> list:
+        """start 到 end（含）之間尚未寫入索引的月份（每月第一天）"""
+        stored = set(self.months())
+        missing = []
+        month = start.replace(day=1)
+        while month <= end:
+            if month_key(month) not in stored:
+                missing.append(month)
+            month = (month + datetime.timedelta(days=32)).replace(day=1)
+        return missing
+
+    def category_totals(self, start: datetime.date, end: datetime.date, accounts: list = None) -> dict:
+        """start 到 end（含）各月各分類的總額，回傳 {YYYY-MM: {分類: 金額}}；accounts 限定加總的帳戶"""
+        accounts = accounts or ACCOUNTS
+        rows = self.db.execute(
+            f"SELECT month, category, SUM(amount) FROM monthly_totals "
+            f"WHERE month BETWEEN ? AND ? AND account IN ({', '.join('?' * len(accounts))}) "
+            f"GROUP BY month, category ORDER BY month, category",
+            (month_key(start), month_key(end), *accounts)
+        )
+
+        totals = {}
+        for month, category, amount in rows:
+            totals.setdefault(month, {})[category or None] = amount
+        return totals
+
+    def account_totals(self, start: datetime.date, end: datetime.date) -> dict:
+        """start 到 end（含）各帳戶的總額，回傳 {帳戶: 金額}"""
+        totals = dict.fromkeys(ACCOUNTS, 0)
+        for account, amount in self.db.execute(
+            "SELECT account, SUM(amount) FROM monthly_totals WHERE month BETWEEN ? AND ? GROUP BY account",
+            (month_key(start), month_key(end))
+        ):
+            totals[account] = amount
+        return totals
+
+    def series(self, category: str, start: datetime.date, end: datetime.date) -> list:
+        """單一分類每月的總額 [(YYYY-MM, 金額), ...]，區間內沒有資料的月份為 0（含未寫入索引的月份，見 missing_months）"""
+        totals = self.category_totals(start, end)
+        return [(month, totals.get(month, {}).get(category, 0)) for month in month_keys(start, end)]
+
+    def rolling_average(self, category: str, start: datetime.date, end: datetime.date, window: int = 3) -> list:
+        """單一分類的移動平均 [(YYYY-MM, 平均), ...]；視窗往前延伸到 start 之前的月份"""
+        first = start
+        for _ in range(window - 1):
+            first = (first.replace(day=1) - datetime.timedelta(days=1)).replace(day=1)
+
+        values = self.series(category, first, end)
+        return [
+            (values[i][0], sum(amount for _, amount in values[i - window + 1:i + 1]) / window)
+            for i in range(window - 1, len(values))
+        ]
+
+    def year_to_date(self, month: datetime.date) -> dict:
+        """該年一月到 month（含）各分類的總額，回傳 {分類: 金額}"""
+        totals = {}
+        for categories in self.category_totals(month.replace(month=1), month).values():
+            for category, amount in categories.items():
+                totals[category] = totals.get(category, 0) + amount
+        return totals
+
+    def trend_mermaid(self, categories: list, start: datetime.date, end: datetime.date) -> str:
+        """各分類每月支出的折線圖（Mermaid xychart，金額取負號與圓餅圖一致）"""
+        months = month_keys(start, end)
+        totals = self.category_totals(start, end)
+        x_axis = ", ".join(f'"{month}"' for month in months)
+
+        lines = [
+            "xychart-beta",
+            f'    title "{month_key(start)} ~ {month_key(end)} 趨勢（依序：{"、".join(categories)}）"',
+            f"    x-axis [{x_axis}]",
+            '    y-axis "金額"',
+        ]
+        for category in categories:
+            values = [-totals.get(month, {}).get(category, 0) for month in months]
+            lines.append(f"    line [{', '.join(format_amount(value) for value in values)}]")
+        return "\n".join(lines)
+
+
+def month_key(month: datetime.date) -> str:
+    return month.strftime("%Y-%m")
+
+
+def month_keys(start: datetime.date, end: datetime.date) -> list:
+    """start 到 end（含）每個月的 YYYY-MM"""
+    keys = []
+    month = start.replace(day=1)
+    while month <= end:
+        keys.append(month_key(month))
+        month = (month + datetime.timedelta(days=32)).replace(day=1)
+    return keys
+
+
+def format_amount(value) -> str:
+    return str(int(value)) if value == int(value) else f"{value:.2f}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="從每月總額索引查詢趨勢、移動平均與年初至今總額")
+    parser.add_argument("start", help="起始月份 YYYYMM")
+    parser.add_argument("end", help="結束月份 YYYYMM")
+    parser.add_argument("--path", default=".cache/ledger_summary.sqlite", help="索引檔路徑")
+    parser.add_argument("--category", action="append", help="要顯示趨勢的分類，可重複指定")
+    parser.add_argument("--window", type=int, default=3, help="移動平均的月數")
+    parser.add_argument("--mermaid", action="store_true", help="輸出 Mermaid 折線圖")
+    args = parser.parse_args()
+
+    start_month = datetime.datetime.strptime(args.start, "%Y%m").date()
+    end_month = datetime.datetime.strptime(args.end, "%Y%m").date()
+
+    summary = LedgerSummary(args.path)
+    try:
+        # 移動平均往前延伸到起始月份之前、年初至今從一月開始，一併檢查索引是否缺少月份
+        window_start = start_month.replace(day=1)
+        for _ in range(args.window - 1 if args.category else 0):
+            window_start = (window_start - datetime.timedelta(days=1)).replace(day=1)
+        missing = summary.missing_months(min(window_start, end_month.replace(month=1)), end_month)
+        if missing:
+            print(f"警告：索引缺少 {', '.join(month_key(month) for month in missing)} 的資料，以下報表中這些月份以 0 計算")
+
+        for month, categories in summary.category_totals(start_month, end_month).items():
+            for category, amount in categories.items():
+                print(f"{month} {category or '未分類'}: {format_amount(amount)}")
+
+        for category in args.category or []:
+            for month, average in summary.rolling_average(category, start_month, end_month, args.window):
+                print(f"{category} {args.window} 個月移動平均 {month}: {average:.2f}")
+
+        for category, amount in summary.year_to_date(end_month).items():
+            print(f"{end_month.year} 年初至今 {category or '未分類'}: {format_amount(amount)}")
+
+        if args.mermaid and args.category:
+            print(summary.trend_mermaid(args.category, start_month, end_month))
+    finally:
+        summary.close()
@@ -0,0 +1,138 @@
+import json
+import math
+import re
+import threading
+
+# 延遲直方圖的區間上限（秒）
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, math.inf)
+
+
+def endpoint_template(path: str) -> str:
+    """將路徑中的 Notion / Medium ID 換成 {id}，讓同一種請求歸在一起"""
+    path = path.split("?", 1)[0]
+    return re.sub(r"/(?:[0-9a-fA-F]{8}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{12}|[0-9a-fA-F]{64,})(?=/|$)",
+                  "/{id}", path)
+
+
+def body_size(body) -> int:
+    if body is None:
+        return 0
+    if isinstance(body, str):
+        return len(body.encode())
+    if isinstance(body, bytes):
+        return len(body)
+    return 0
+
+
+class RequestMetrics:
+    """彙總每個端點的延遲、狀態碼、傳輸量、重試次數與限速等待時間
+
+    作為 NotionApi 的 request hook 使用（hooks=[metrics.record]），
+    工作結束時以 dump() 輸出成 JSON 或 Prometheus 文字格式（副檔名為 .prom 時）。
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.endpoints = {}
+
+    def record(self, record: dict):
+        """record 欄位：service、method、endpoint、status、latency、bytes_out、bytes_in、retries、rate_limit_wait"""
+        key = (record["service"], record["method"], record["endpoint"])
+        with self.lock:
+            stats = self.endpoints.get(key)
+            if stats is None:
+                stats = self.endpoints[key] = {
+                    "count": 0,
+                    "latency_sum": 0.0,
+                    "latency_max": 0.0,
+                    "latency_buckets": [0] * len(LATENCY_BUCKETS),
+                    "status": {},
+                    "bytes_out": 0,
+                    "bytes_in": 0,
+                    "retries": 0,
+                    "rate_limit_wait": 0.0,
+                }
+
+            latency = record["latency"]
+            stats["count"] += 1
+            stats["latency_sum"] += latency
+            stats["latency_max"] = max(stats["latency_max"], latency)
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if latency <= bound:
+                    stats["latency_buckets"][i] += 1
+                    break
+
+            status = str(record["status"])
+            stats["status"][status] = stats["status"].get(status, 0) + 1
+            stats["bytes_out"] += record.get("bytes_out", 0)
+            stats["bytes_in"] += record.get("bytes_in", 0)
+            stats["retries"] += record.get("retries", 0)
+            stats["rate_limit_wait"] += record.get("rate_limit_wait", 0.0)
+
+    def to_dict(self) -> dict:
+        with self.lock:
+            return {
+                "endpoints": [
+                    dict(
+                        stats,
+                        service=service,
+                        method=method,
+                        endpoint=endpoint,
+                        latency_buckets=dict(zip(map(str, LATENCY_BUCKETS), stats["latency_buckets"]))
+                    )
+                    for (service, method, endpoint), stats in sorted(
+                        self.endpoints.items(), key=lambda item: -item[1]["latency_sum"]
+                    )
+                ]
+            }
+
+    def to_prometheus(self) -> str:
+        lines = [
+            "# TYPE cron_jobs_request_duration_seconds histogram",
+            "# TYPE cron_jobs_requests_total counter",
+            "# TYPE cron_jobs_request_bytes_total counter",
+            "# TYPE cron_jobs_request_retries_total counter",
+            "# TYPE cron_jobs_rate_limit_wait_seconds_total counter",
+        ]
+        with self.lock:
+            for (service, method, endpoint), stats in sorted(self.endpoints.items()):
+                labels = f'service="{escape(service)}",method="{escape(method)}",endpoint="{escape(endpoint)}"'
+
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS, stats["latency_buckets"]):
+                    cumulative += count
+                    le = "+Inf" if bound == math.inf else str(bound)
+                    lines.append(f'cron_jobs_request_duration_seconds_bucket{{{labels},le="{le}"}} {cumulative}')
+                lines.append(f"cron_jobs_request_duration_seconds_sum{{{labels}}} {stats['latency_sum']}")
+                lines.append(f"cron_jobs_request_duration_seconds_count{{{labels}}} {stats['count']}")
+
+                for status, count in sorted(stats["status"].items()):
+                    lines.append(f'cron_jobs_requests_total{{{labels},status="{status}"}} {count}')
+                lines.append(f'cron_jobs_request_bytes_total{{{labels},direction="out"}} {stats["bytes_out"]}')
+                lines.append(f'cron_jobs_request_bytes_total{{{labels},direction="in"}} {stats["bytes_in"]}')
+                lines.append(f"cron_jobs_request_retries_total{{{labels}}} {stats['retries']}")
+                lines.append(f"cron_jobs_rate_limit_wait_seconds_total{{{labels}}} {stats['rate_limit_wait']}")
+
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> str:
+        """依總耗時排序的簡表，方便直接在工作紀錄中查看"""
+        lines = []
+        for stats in self.to_dict()["endpoints"]:
+            lines.append(
+                f"{stats['service']:<7} {stats['method']:<6} {stats['endpoint']:<36} "
+                f"{stats['count']:>5} 次  總計 {stats['latency_sum']:>7.2f}s  最長 {stats['latency_max']:>6.2f}s  "
+                f"重試 {stats['retries']:>3}  限速等待 {stats['rate_limit_wait']:>6.2f}s"
+            )
+        return "\n".join(lines)
+
+    def dump(self, path: str):
+        with open(path, "w", encoding="utf-8") as file:
+            if path.endswith(".prom"):
+                file.write(self.to_prometheus())
+            else:
+                json.dump(self.to_dict(), file, ensure_ascii=False, indent=2)
+
+
+def escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
@@ -1,101 +1,235 @@
+import asyncio
 import json
+import os
+import threading
+import time
+import urllib.parse
 import requests
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from json_stream import ResultStream, read_results
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from metrics import endpoint_template
+from rate_limiter import TokenBucket, shared_rate_limiter
+
+# 可用環境變數指向本機的替代伺服器（例如 benchmarks/fake_server.py）
+NOTION_API_URL = os.getenv("NOTION_API_URL", "https://api.notion.com/v1")
 
 # https://developers.notion.com/reference/intro
 class NotionApi:
-    def __init__(self, token):
+    def __init__(self, token, pool_size: int = 10, max_retries: int = 5, backoff_factor: float = 0.5,
+                 rate_limiter: TokenBucket = None, schema_ttl: float = 86400, schema_cache_path: str = None,
+                 request_hooks: list = None):
         self.token = token
+        # 未指定時使用同一台機器上所有行程共用的 Notion 限速器（NOTION_RATE，預設 3 req/s）
+        self.rate_limiter = rate_limiter or shared_rate_limiter("notion", 3)
+        self.request_hooks = list(request_hooks or [])
+        self.schema_ttl = schema_ttl
+        self.schema_cache_path = schema_cache_path
+        self.schema_lock = threading.Lock()
+        self.schemas = self.__load_schema_cache()
+        self.session = self.__create_session(pool_size, max_retries, backoff_factor)
+        # 建立頁面、新增區塊不是冪等操作，另用只在 429 與連線失敗時重試的 Session
+        self.write_session = self.__create_session(pool_size, max_retries, backoff_factor, idempotent = False)
 
-    def query_database(self, database_id: str, body: dict):
-        return requests.post(
-            f"https://api.notion.com/v1/databases/{database_id}/query",
-            data = json.dumps(body),
-            headers = self.__header()
-        )
+    def close(self):
+        self.session.close()
+        self.write_session.close()
+
+    def add_request_hook(self, hook):
+        """每個請求完成後呼叫 hook(record)，record 包含端點、延遲、狀態碼、傳輸量、重試次數與限速等待時間"""
+        self.request_hooks.append(hook)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def query_database(self, database_id: str, body: dict, filter_properties: list = None, stream: bool = False):
+        """filter_properties 為屬性名稱列表時，Notion 只回傳這些屬性；stream 時回應內容不預先讀取"""
+        params = None
+        if filter_properties:
+            # 屬性 ID 本身可能已含 % 編碼，直接組成查詢字串避免被重複編碼
+            params = "&".join(
+                f"filter_properties={urllib.parse.quote(property_id, safe='%')}"
+                for property_id in self.get_property_ids(database_id, filter_properties)
+            )
+        return self.__request("POST", f"/databases/{database_id}/query", body, params, stream)
+
+    def iter_query(self, database_id: str, body: dict, page_size: int = 100, filter_properties: list = None,
+                   decoder=None, stream: bool = False):
+        """逐頁查詢資料庫，依 has_more / next_cursor 翻頁並逐筆產出結果
+
+        filter_properties 限定回傳的屬性；decoder 將每筆頁面轉成較精簡的記錄（例如 LedgerEntry.from_page）；
+        stream 時邊接收邊解析 results，不需先緩衝整個回應。
+        """
+        body = dict(body)
+        body["page_size"] = page_size
+
+        while True:
+            response = self.query_database(database_id, body, filter_properties, stream)
+            if response.status_code != 200:
+                raise Exception(f"無法查詢資料庫 {database_id}: {response.text}")
+
+            if stream:
+                results = ResultStream(response)
+                yield from results if decoder is None else map(decoder, results)
+                data = results.metadata
+            else:
+                data = response.json()
+                yield from data["results"] if decoder is None else map(decoder, data["results"])
+
+            if not data.get("has_more"):
+                break
+            body["start_cursor"] = data["next_cursor"]
 
     def patch_page(self, page_id: str, properties: dict):
-        requests.patch(
-            f"https://api.notion.com/v1/pages/{page_id}",
-            data = json.dumps(properties),
-            headers = self.__header()
-        )
+        return self.__request("PATCH", f"/pages/{page_id}", properties)
 
-    def create_page(self, database_id: str, properties: dict):
+    def create_page(self, database_id: str, properties: dict, children: list = None):
         body = {
             "parent": { "database_id": database_id },
             "properties": properties
         }
+        if children:
+            body["children"] = children
         
-        return requests.post(
-            "https://api.notion.com/v1/pages", 
-            data = json.dumps(body),
-            headers = self.__header()
-        )
+        return self.__request("POST", "/pages", body, idempotent = False)
 
     def get_page(self, page_id: str):
         """獲取頁面屬性和基本資訊"""
-        return requests.get(
-            f"https://api.notion.com/v1/pages/{page_id}",
-            headers=self.__header()
-        )
-    
-    def get_block_children(self, block_id: str):
-        """獲取區塊的子內容"""
-        return requests.get(
-            f"https://api.notion.com/v1/blocks/{block_id}/children",
-            headers=self.__header()
-        )
+        return self.__request("GET", f"/pages/{page_id}")
     
+    def get_block_children(self, block_id: str, start_cursor: str = None, page_size: int = 100, stream: bool = False):
+        """獲取區塊的子內容（單頁）"""
+        params = {"page_size": page_size}
+        if start_cursor:
+            params["start_cursor"] = start_cursor
+
+        return self.__request("GET", f"/blocks/{block_id}/children", params = params, stream = stream)
+
+    def iter_block_children(self, block_id: str, stream: bool = False):
+        """逐頁獲取區塊的所有子內容，stream 時邊接收邊解析"""
+        start_cursor = None
+        while True:
+            response = self.get_block_children(block_id, start_cursor, stream = stream)
+            if response.status_code != 200:
+                raise Exception(f"無法獲取區塊內容 {block_id}: {response.text}")
+
+            if stream:
+                results = ResultStream(response)
+                yield from results
+                data = results.metadata
+            else:
+                data = response.json()
+                yield from data["results"]
+
+            if not data.get("has_more"):
+                break
+            start_cursor = data["next_cursor"]
+
+    def get_block_tree(self, block_id: str, max_workers: int = 4) -> list:
+        """遞迴獲取區塊底下的完整區塊樹，子區塊放在 block["children"]
+
+        每個有子內容的區塊一完成就立即排入執行緒池，各子樹同時抓取，
+        所需時間約為樹的深度乘上翻頁次數，而非區塊總數。
+        """
+        tree = []
+        with ThreadPoolExecutor(max_workers = max_workers) as executor:
+            pending = {executor.submit(self.__list_block_children, block_id): tree}
+
+            while pending:
+                done, _ = wait(pending, return_when = FIRST_COMPLETED)
+                for future in done:
+                    children = pending.pop(future)
+                    children.extend(future.result())
+
+                    for block in children:
+                        # 子頁面與子資料庫是獨立的頁面，不展開
+                        if block.get("has_children") and block["type"] not in ("child_page", "child_database"):
+                            block["children"] = []
+                            pending[executor.submit(self.__list_block_children, block["id"])] = block["children"]
+
+        return tree
+
     def get_page_content(self, page_id: str):
-        """獲取完整的頁面內容，包含屬性和所有區塊"""
+        """獲取完整的頁面內容，包含屬性和所有區塊（含巢狀子區塊）"""
         page_response = self.get_page(page_id)
-        blocks_response = self.get_block_children(page_id)
-        
+
         if page_response.status_code != 200:
             raise Exception(f"無法獲取頁面: {page_response.text}")
-        
-        if blocks_response.status_code != 200:
-            raise Exception(f"無法獲取頁面內容: {blocks_response.text}")
-        
+
         return {
             "page": page_response.json(),
-            "blocks": blocks_response.json()
+            "blocks": {"results": self.get_block_tree(page_id)}
         }
     
     def get_database(self, database_id: str):
         """獲取資料庫屬性結構"""
-        return requests.get(
-            f"https://api.notion.com/v1/databases/{database_id}",
-            headers=self.__header()
-        )
+        return self.__request("GET", f"/databases/{database_id}")
     
-    def get_property_names_by_type(self, database_id: str, property_types: list):
-        """根據屬性類型自動偵測屬性名稱"""
+    def get_database_schema(self, database_id: str) -> dict:
+        """獲取資料庫屬性結構（快取 schema_ttl 秒，可選擇同時保存到檔案）"""
+        with self.schema_lock:
+            cached = self.schemas.get(database_id)
+            if cached and time.time() - cached["fetched_at"] < self.schema_ttl:
+                return cached["schema"]
+
         response = self.get_database(database_id)
         if response.status_code != 200:
             raise Exception(f"無法獲取資料庫 {database_id}: {response.text}")
-        
-        properties = response.json()["properties"]
-        result = {}
-        
-        for prop_name, prop_info in properties.items():
-            prop_type = prop_info['type']
-            if prop_type in property_types:
-                result[prop_type] = prop_name
-        
-        return result
-    
+
+        schema = response.json()
+        with self.schema_lock:
+            self.schemas[database_id] = self.__schema_entry(schema, time.time())
+            self.__save_schema_cache()
+
+        return schema
+
+    def get_property_index(self, database_id: str) -> dict:
+        """屬性類型 → 屬性名稱列表的索引"""
+        self.get_database_schema(database_id)
+        with self.schema_lock:
+            return self.schemas[database_id]["index"]
+
+    def get_property_ids(self, database_id: str, names: list) -> list:
+        """屬性名稱轉成屬性 ID；快取中找不到時重新取得一次屬性結構（屬性可能剛被改名或新增）"""
+        properties = self.get_database_schema(database_id)["properties"]
+        if any(name not in properties for name in names):
+            self.invalidate_schema(database_id)
+            properties = self.get_database_schema(database_id)["properties"]
+
+        missing = [name for name in names if name not in properties]
+        if missing:
+            raise Exception(f"資料庫 {database_id} 沒有屬性: {', '.join(missing)}")
+        return [properties[name]["id"] for name in names]
+
+    def invalidate_schema(self, database_id: str = None):
+        """清除指定資料庫（未指定則全部）的屬性結構快取"""
+        with self.schema_lock:
+            if database_id is None:
+                self.schemas.clear()
+            else:
+                self.schemas.pop(database_id, None)
+            self.__save_schema_cache()
+
+    def get_property_names_by_type(self, database_id: str, property_types: list):
+        """根據屬性類型自動偵測屬性名稱"""
+        index = self.get_property_index(database_id)
+        return {
+            prop_type: index[prop_type][-1]
+            for prop_type in property_types
+            if prop_type in index
+        }
+
     def append_block_children(self, block_id: str, children: list):
         """向頁面或區塊加入子區塊內容"""
         body = {
             "children": children
         }
         
-        return requests.patch(
-            f"https://api.notion.com/v1/blocks/{block_id}/children",
-            data=json.dumps(body),
-            headers=self.__header()
-        )
+        return self.__request("PATCH", f"/blocks/{block_id}/children", body, idempotent = False)
     
     def check_record_exists(self, database_id: str, title_property: str, title_value: str):
         """檢查資料庫中是否已存在指定標題的記錄"""
@@ -117,10 +251,295 @@ class NotionApi:
             print(response.text)
             return False
 
+    def find_existing_titles(self, database_id: str, title_property: str, titles: list, chunk_size: int = 100) -> dict:
+        """一次查詢多個標題是否已存在，回傳 {已存在的標題: 頁面 ID}
+
+        以 OR 條件合併標題（每次最多 chunk_size 個），不論要檢查多少筆都只需一次（分頁）查詢。
+        """
+        titles = list(dict.fromkeys(titles))
+        existing = {}
+
+        for i in range(0, len(titles), chunk_size):
+            filter_body = {
+                "filter": {
+                    "or": [
+                        {
+                            "property": title_property,
+                            "title": {
+                                "equals": title
+                            }
+                        }
+                        for title in titles[i:i + chunk_size]
+                    ]
+                }
+            }
+
+            for result in self.iter_query(database_id, filter_body):
+                title = "".join(text["plain_text"] for text in result["properties"][title_property]["title"])
+                existing.setdefault(title, result["id"])
+
+        return existing
+
+    @staticmethod
+    def __schema_entry(schema: dict, fetched_at: float) -> dict:
+        index = {}
+        for prop_name, prop_info in schema["properties"].items():
+            index.setdefault(prop_info["type"], []).append(prop_name)
+
+        return {"schema": schema, "index": index, "fetched_at": fetched_at}
+
+    def __load_schema_cache(self) -> dict:
+        if not self.schema_cache_path or not os.path.exists(self.schema_cache_path):
+            return {}
+
+        # 快取檔損毀（例如寫入中途被中斷）時視為沒有快取，下次取得 schema 時重新寫入
+        try:
+            with open(self.schema_cache_path, encoding="utf-8") as file:
+                cached = json.load(file)
+
+            return {
+                database_id: self.__schema_entry(entry["schema"], entry["fetched_at"])
+                for database_id, entry in cached.items()
+            }
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as error:
+            print(f"略過無法讀取的 schema 快取 {self.schema_cache_path}: {error}")
+            return {}
+
+    def __save_schema_cache(self):
+        if not self.schema_cache_path:
+            return
+
+        directory = os.path.dirname(self.schema_cache_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # 先寫入暫存檔再改名，中斷時不會留下不完整的快取檔；多個行程可能共用同一個快取檔，暫存檔名加上 pid
+        temp_path = f"{self.schema_cache_path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(
+                {
+                    database_id: {"schema": entry["schema"], "fetched_at": entry["fetched_at"]}
+                    for database_id, entry in self.schemas.items()
+                },
+                file,
+                ensure_ascii=False
+            )
+        os.replace(temp_path, self.schema_cache_path)
+
+    def __list_block_children(self, block_id: str) -> list:
+        # 區塊物件較大，邊接收邊解析，不同時保留原始回應與解析結果
+        return list(self.iter_block_children(block_id, stream = True))
+
+    def __request(self, method: str, path: str, body: dict = None, params=None, stream: bool = False,
+                  idempotent: bool = True):
+        """透過共用的 Session 發送請求，沿用 keep-alive 連線
+
+        stream 時不預先讀取回應內容，呼叫端需讀完或關閉回應才會歸還連線；
+        idempotent 為 False 的寫入不在 5xx 或讀取逾時後重試，避免 Notion 已寫入時重複建立。
+        """
+        waited = self.rate_limiter.acquire() if self.rate_limiter is not None else 0.0
+        data = None if body is None else json.dumps(body)
+
+        started = time.perf_counter()
+        session = self.session if idempotent else self.write_session
+        response = session.request(
+            method,
+            f"{NOTION_API_URL}{path}",
+            data = data,
+            params = params,
+            headers = self.__header(),
+            stream = stream
+        )
+
+        if self.request_hooks:
+            retries = getattr(response.raw, "retries", None)
+            record = {
+                "service": "notion",
+                "method": method,
+                "endpoint": endpoint_template(path),
+                "status": response.status_code,
+                "latency": time.perf_counter() - started,
+                "bytes_out": len(data.encode()) if data else 0,
+                "bytes_in": 0,
+                "retries": len(retries.history) if retries else 0,
+                "rate_limit_wait": waited
+            }
+            if stream and response.status_code == 200:
+                # 串流回應讀完才知道實際大小（chunked 回應沒有 Content-Length），由 ResultStream 讀完時回報
+                response.on_consumed = lambda bytes_read: self.__emit(dict(record, bytes_in=bytes_read))
+            else:
+                record["bytes_in"] = len(response.content)
+                self.__emit(record)
+
+        return response
+
+    def __emit(self, record: dict):
+        for hook in self.request_hooks:
+            hook(record)
+
+    @staticmethod
+    def __create_session(pool_size: int, max_retries: int, backoff_factor: float,
+                         idempotent: bool = True) -> requests.Session:
+        """建立連線池 Session，遇到 429 / 5xx 時以指數退避重試，並遵循 Retry-After
+
+        非冪等的 Session 只重試 429 與連線建立失敗（請求尚未送出），
+        5xx 與讀取逾時時 Notion 可能已完成寫入，因此不重試。
+        """
+        if idempotent:
+            retry = Retry(
+                total = max_retries,
+                backoff_factor = backoff_factor,
+                status_forcelist = [429, 500, 502, 503, 504],
+                allowed_methods = ["GET", "POST", "PATCH"],
+                respect_retry_after_header = True,
+                raise_on_status = False
+            )
+        else:
+            retry = Retry(
+                total = max_retries,
+                connect = max_retries,
+                read = 0,
+                other = 0,
+                backoff_factor = backoff_factor,
+                status_forcelist = [429],
+                allowed_methods = ["POST", "PATCH"],
+                respect_retry_after_header = True,
+                raise_on_status = False
+            )
+        adapter = HTTPAdapter(pool_connections = pool_size, pool_maxsize = pool_size, max_retries = retry)
+
+        session = requests.Session()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
     def __header(self) -> dict:
         return {
             "Content-type": "application/json",
             "Notion-Version": "2022-06-28",
             "Authorization": f"Bearer {self.token}"
         }
-    
\ No newline at end of file
+
+
+class AsyncNotionApi:
+    """NotionApi 的 asyncio 版本，讓彼此獨立的請求可以同時進行
+
+    每個請求在執行緒中透過同一個 NotionApi（共用連線池）送出，
+    以 semaphore 限制同時請求數，並以 token bucket 維持在 Notion 約 3 req/s 的限制內；
+    未指定 rate 時與其他行程共用同一個限速器。
+    """
+
+    def __init__(self, token, rate: float = None, max_concurrency: int = 3, **kwargs):
+        rate_limiter = TokenBucket(rate) if rate else None
+        self.api = NotionApi(token, pool_size = max_concurrency, rate_limiter = rate_limiter, **kwargs)
+        self.max_concurrency = max_concurrency
+        self.semaphore = None
+        self.semaphore_loop = None
+
+    def close(self):
+        self.api.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
+
+    async def query_database(self, database_id: str, body: dict, filter_properties: list = None, stream: bool = False):
+        return await self.__call(self.api.query_database, database_id, body, filter_properties, stream)
+
+    async def iter_query(self, database_id: str, body: dict, page_size: int = 100, filter_properties: list = None,
+                         decoder=None, stream: bool = False):
+        """逐頁查詢資料庫的非同步產生器
+
+        stream 時在工作執行緒中邊接收邊解析每一頁，只保留解析（及 decoder 轉換）後的結果。
+        """
+        body = dict(body)
+        body["page_size"] = page_size
+
+        while True:
+            response = await self.query_database(database_id, body, filter_properties, stream)
+            if response.status_code != 200:
+                raise Exception(f"無法查詢資料庫 {database_id}: {response.text}")
+
+            if stream:
+                results, data = await self.__call(read_results, response, decoder)
+                for result in results:
+                    yield result
+            else:
+                data = response.json()
+                for result in data["results"]:
+                    yield result if decoder is None else decoder(result)
+
+            if not data.get("has_more"):
+                break
+            body["start_cursor"] = data["next_cursor"]
+
+    async def patch_page(self, page_id: str, properties: dict):
+        return await self.__call(self.api.patch_page, page_id, properties)
+
+    async def create_page(self, database_id: str, properties: dict, children: list = None):
+        return await self.__call(self.api.create_page, database_id, properties, children)
+
+    async def get_page(self, page_id: str):
+        return await self.__call(self.api.get_page, page_id)
+
+    async def get_block_children(self, block_id: str, start_cursor: str = None, page_size: int = 100,
+                                 stream: bool = False):
+        return await self.__call(self.api.get_block_children, block_id, start_cursor, page_size, stream)
+
+    async def get_block_tree(self, block_id: str):
+        # 區塊樹在執行緒池內同時抓取，速率由 NotionApi 的 token bucket 控制
+        return await asyncio.to_thread(self.api.get_block_tree, block_id, self.max_concurrency)
+
+    async def get_page_content(self, page_id: str):
+        """同時獲取頁面屬性與完整區塊樹"""
+        page_response, blocks = await asyncio.gather(
+            self.get_page(page_id),
+            self.get_block_tree(page_id)
+        )
+
+        if page_response.status_code != 200:
+            raise Exception(f"無法獲取頁面: {page_response.text}")
+
+        return {
+            "page": page_response.json(),
+            "blocks": {"results": blocks}
+        }
+
+    async def get_database(self, database_id: str):
+        return await self.__call(self.api.get_database, database_id)
+
+    async def get_database_schema(self, database_id: str):
+        return await self.__call(self.api.get_database_schema, database_id)
+
+    async def get_property_index(self, database_id: str):
+        return await self.__call(self.api.get_property_index, database_id)
+
+    async def get_property_ids(self, database_id: str, names: list):
+        return await self.__call(self.api.get_property_ids, database_id, names)
+
+    def invalidate_schema(self, database_id: str = None):
+        self.api.invalidate_schema(database_id)
+
+    async def get_property_names_by_type(self, database_id: str, property_types: list):
+        return await self.__call(self.api.get_property_names_by_type, database_id, property_types)
+
+    async def append_block_children(self, block_id: str, children: list):
+        return await self.__call(self.api.append_block_children, block_id, children)
+
+    async def check_record_exists(self, database_id: str, title_property: str, title_value: str):
+        return await self.__call(self.api.check_record_exists, database_id, title_property, title_value)
+
+    async def find_existing_titles(self, database_id: str, title_property: str, titles: list):
+        return await self.__call(self.api.find_existing_titles, database_id, title_property, titles)
+
+    async def __call(self, func, *args):
+        # semaphore 需在事件迴圈內建立（Python 3.9 會綁定建立時的迴圈），換了迴圈就重建
+        loop = asyncio.get_running_loop()
+        if self.semaphore_loop is not loop:
+            self.semaphore = asyncio.Semaphore(self.max_concurrency)
+            self.semaphore_loop = loop
+
+        async with self.semaphore:
+            return await asyncio.to_thread(func, *args)
@@ -0,0 +1,113 @@
+import asyncio
+import json
+import os
+
+
+class PageWrite:
+    """一筆建立頁面的操作
+
+    key 為冪等鍵，同一個 key 只會建立一次；
+    有 title_property 時，寫入前會先確認資料庫中沒有同標題的記錄。
+    """
+
+    def __init__(self, key: str, database_id: str, properties: dict, children: list = None,
+                 title_property: str = None, title: str = None):
+        self.key = key
+        self.database_id = database_id
+        self.properties = properties
+        self.children = children
+        self.title_property = title_property
+        self.title = title or key
+
+
+class BulkPageWriter:
+    """以 AsyncNotionApi 同時建立多個頁面（受其速率限制），並以本機日誌記錄已完成的操作
+
+    重新執行時直接略過日誌中已完成的操作，不需再查詢 Notion；
+    中途失敗的批次只會補做未完成的部分。
+    """
+
+    def __init__(self, async_notion_api, journal_path: str):
+        self.api = async_notion_api
+        self.journal_path = journal_path
+        self.completed = self.__load_journal()
+
+    async def write(self, operations: list) -> dict:
+        """執行所有尚未完成的操作，回傳 {key: 頁面 ID}（失敗的操作為 None）"""
+        results = {}
+        pending = []
+        for operation in operations:
+            if operation.key in self.completed:
+                print(f"'{operation.title}' 已記錄於日誌，跳過創建")
+                results[operation.key] = self.completed[operation.key]
+            else:
+                pending.append(operation)
+
+        pending = await self.__skip_existing(pending, results)
+        page_ids = await asyncio.gather(*[self.__create(operation) for operation in pending])
+        results.update(zip([operation.key for operation in pending], page_ids))
+        return results
+
+    async def __skip_existing(self, operations: list, results: dict) -> list:
+        """日誌以外建立的頁面（例如舊版程式或手動建立），以每個資料庫一次的查詢找出並補記日誌"""
+        groups = {}
+        for operation in operations:
+            if operation.title_property:
+                groups.setdefault((operation.database_id, operation.title_property), []).append(operation)
+
+        existing_by_group = await asyncio.gather(*[
+            self.api.find_existing_titles(database_id, title_property, [operation.title for operation in group])
+            for (database_id, title_property), group in groups.items()
+        ])
+
+        skipped = set()
+        for group, existing in zip(groups.values(), existing_by_group):
+            for operation in group:
+                if operation.title in existing:
+                    print(f"'{operation.title}' 已存在，跳過創建")
+                    self.__record(operation.key, existing[operation.title])
+                    results[operation.key] = existing[operation.title]
+                    skipped.add(operation.key)
+
+        return [operation for operation in operations if operation.key not in skipped]
+
+    async def __create(self, operation: PageWrite):
+        response = await self.api.create_page(operation.database_id, operation.properties, operation.children)
+
+        if response.status_code != 200:
+            print(f"創建 '{operation.title}' 失敗: {response.status_code}")
+            print(response.text)
+            return None
+
+        page_id = response.json()["id"]
+        print(f"成功創建 '{operation.title}', ID: {page_id}")
+        self.__record(operation.key, page_id)
+        return page_id
+
+    def __load_journal(self) -> dict:
+        if not os.path.exists(self.journal_path):
+            return {}
+
+        completed = {}
+        with open(self.journal_path, encoding="utf-8") as file:
+            for line in file:
+                # 寫入到一半中斷的最後一行直接忽略
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                completed[entry["key"]] = entry["page_id"]
+
+        return completed
+
+    def __record(self, key: str, page_id: str):
+        directory = os.path.dirname(self.journal_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with open(self.journal_path, "a", encoding="utf-8") as file:
+            file.write(json.dumps({"key": key, "page_id": page_id}, ensure_ascii=False) + "\n")
+            file.flush()
+            os.fsync(file.fileno())
+
+        self.completed[key] = page_id
@@ -1,26 +1,154 @@
 import sys
+import argparse
+import hashlib
+import io
 import requests
 import json
 import os
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from image_cache import ImageUploadCache
+from metrics import RequestMetrics, body_size, endpoint_template
 from notion_api import NotionApi
+from rate_limiter import shared_rate_limiter
 
+# 可用環境變數指向本機的替代伺服器（例如 benchmarks/fake_server.py）
+MEDIUM_API_URL = os.getenv("MEDIUM_API_URL", "https://api.medium.com/v1")
 
-def get_notion_page_content(page_id: str):
-    """從 Notion 獲取頁面內容並轉換為 markdown 格式"""
+_image_cache = None
+_image_cache_lock = threading.Lock()
+
+# Medium 與 Notion 分開限速，且與同一台機器上的其他工作共用；速率可用 MEDIUM_RATE 環境變數調整（每秒請求數）
+medium_rate_limiter = shared_rate_limiter("medium", 2)
+
+# Notion 與 Medium 請求的指標，設定 METRICS_PATH 時於結束時輸出（.prom 為 Prometheus 格式，其餘為 JSON）
+request_metrics = RequestMetrics()
+
+
+def medium_request(method: str, url: str, service: str = "medium", **kwargs):
+    """發送 Medium（或圖片下載）請求並記錄請求指標，Medium API 另外套用限速"""
+    waited = medium_rate_limiter.acquire() if service == "medium" else 0.0
+
+    started = time.perf_counter()
+    response = requests.request(method, url, **kwargs)
+
+    # 圖片下載的 URL 各不相同，只以主機名稱分組
+    parsed_url = urllib.parse.urlparse(url)
+    request_metrics.record({
+        "service": service,
+        "method": method,
+        "endpoint": endpoint_template(parsed_url.path) if service == "medium" else parsed_url.netloc,
+        "status": response.status_code,
+        "latency": time.perf_counter() - started,
+        "bytes_out": body_size(response.request.body),
+        "bytes_in": len(response.content),
+        "retries": 0,
+        "rate_limit_wait": waited
+    })
+    return response
+
+
+def get_image_cache() -> ImageUploadCache:
+    """取得圖片上傳快取（路徑可用 MEDIUM_IMAGE_CACHE 環境變數指定）"""
+    global _image_cache
+    with _image_cache_lock:
+        if _image_cache is None:
+            _image_cache = ImageUploadCache(os.getenv("MEDIUM_IMAGE_CACHE", ".cache/medium_images.sqlite"))
+        return _image_cache
+
+
+def create_notion_api() -> NotionApi:
     notion_token = os.getenv("NOTION_SECRET")
     if not notion_token:
         raise ValueError("請設定 NOTION_SECRET 環境變數")
 
-    notion_api = NotionApi(notion_token)
-    content = notion_api.get_page_content(page_id)
+    # 區塊樹會同時抓取，以共用的 token bucket 維持在 Notion 約 3 req/s 的限制內（含其他同時執行的工作）
+    return NotionApi(notion_token, request_hooks=[request_metrics.record])
+
+
+def get_notion_page_content(page_id: str, notion_api: NotionApi = None):
+    """從 Notion 獲取頁面內容並轉換為 markdown 格式"""
+    if notion_api is None:
+        with create_notion_api() as notion_api:
+            content = notion_api.get_page_content(page_id)
+    else:
+        content = notion_api.get_page_content(page_id)
 
     return convert_notion_to_markdown(content["page"], content["blocks"])
 
 
+def publish_ready_pages(database_id: str, status_property: str = "狀態", ready_value: str = "Ready",
+                        url_property: str = "Medium URL", published_value: str = None, max_workers: int = 3,
+                        notion_api: NotionApi = None) -> dict:
+    """將資料庫中狀態為 ready_value 的頁面全部發佈到 Medium，並把文章 URL 寫回 url_property
+
+    每個頁面的 抓取 → 轉換 → 上傳圖片 → 發文 流程在執行緒池中同時進行，
+    Notion 與 Medium 各自限速；有指定 published_value 時一併更新狀態。
+    url_property 已有值的頁面視為已發佈而略過。
+    可傳入共用的 notion_api（例如 job_runner 的連線池），未提供時自行建立。
+    回傳 {頁面 ID: Medium URL}（失敗的頁面為 None）。
+    """
+    if notion_api is None:
+        with create_notion_api() as notion_api:
+            return publish_ready_pages(database_id, status_property, ready_value, url_property, published_value,
+                                       max_workers, notion_api)
+
+    # 狀態欄位可能是 status 或 select 類型
+    schema = notion_api.get_database_schema(database_id)
+    status_type = schema["properties"][status_property]["type"]
+    # 已寫回 Medium URL 的頁面代表已發佈過，即使狀態仍是 ready_value 也不再重複建立草稿
+    filter_body = {
+        "filter": {
+            "and": [
+                {"property": status_property, status_type: {"equals": ready_value}},
+                {"property": url_property, "url": {"is_empty": True}}
+            ]
+        }
+    }
+    pages = list(notion_api.iter_query(database_id, filter_body))
+    print(f"待發佈頁面: {len(pages)} 篇")
+
+    def publish(page):
+        try:
+            # 頁面屬性已在查詢結果中，只需抓取區塊樹
+            blocks = notion_api.get_block_tree(page["id"])
+            notion_data = convert_notion_to_markdown(page, {"results": blocks})
+            post_url = create_post(notion_data["title"], notion_data["content"], notion_data["tags"])
+
+            properties = {url_property: {"url": post_url}}
+            if published_value:
+                properties[status_property] = {status_type: {"name": published_value}}
+
+            response = notion_api.patch_page(page["id"], {"properties": properties})
+            if response.status_code != 200:
+                # 文章已建立但未寫回，下次執行會再發佈一次，需手動補上 URL
+                print(f"寫回 Medium URL 失敗（文章已建立: {post_url}）: {response.status_code}, {response.text}")
+                return None
+
+            print(f"發佈成功: {notion_data['title']} -> {post_url}")
+            return post_url
+        except Exception as e:
+            print(f"發佈頁面 {page['id']} 失敗: {e}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return dict(zip([page["id"] for page in pages], executor.map(publish, pages)))
+
+
 def convert_notion_to_markdown(page_data, blocks_data):
     """將 Notion 內容轉換為 markdown 格式"""
-    markdown_content = ""
+    out = io.StringIO()
+    title = write_notion_markdown(out, page_data, blocks_data)
+    return {"title": title, "content": out.getvalue(), "tags": []}
+
 
+def write_notion_markdown(out, page_data, blocks_data, max_workers: int = 4) -> str:
+    """將 Notion 頁面以 markdown 逐區塊寫入 out（檔案或 io.StringIO），回傳標題
+
+    圖片 URL 先從區塊樹收集並同時上傳，渲染時直接寫入 Medium URL，不需要再掃描整份文字。
+    """
     # 獲取標題
     title = ""
     if "properties" in page_data:
@@ -29,81 +157,108 @@ def convert_notion_to_markdown(page_data, blocks_data):
                 title = "".join([text["plain_text"] for text in prop_data["title"]])
                 break
 
+    # 處理圖片上傳（同一個 URL 只上傳一次）
+    blocks = blocks_data["results"]
+    image_urls = upload_images_to_medium(list(dict.fromkeys(iter_image_urls(blocks))), max_workers)
+
     # 如果有標題，加入 markdown
     if title:
-        markdown_content += f"# {title}\n\n"
+        out.write(f"# {title}\n\n")
+
+    # 轉換內容塊（含巢狀子區塊）
+    write_blocks_markdown(out, blocks, image_urls)
+
+    return title
+
+
+def iter_image_urls(blocks):
+    """走訪區塊樹，逐一產出需要上傳到 Medium 的外部圖片 URL"""
+    for block in blocks:
+        if block["type"] == "image":
+            image_url = get_image_url(block["image"])
+            if image_url.startswith(("http://", "https://")):
+                yield image_url
 
-    # 轉換內容塊
-    for block in blocks_data["results"]:
-        block_markdown = convert_block_to_markdown(block)
-        markdown_content += block_markdown
+        if block.get("children"):
+            yield from iter_image_urls(block["children"])
 
-    # 處理圖片上傳
-    markdown_content = process_images_in_markdown(markdown_content)
 
-    return {"title": title, "content": markdown_content, "tags": []}
+def write_blocks_markdown(out, blocks, image_urls: dict = None, indent=""):
+    """將區塊列表（含 children 子區塊）逐一轉換並寫入 out"""
+    for block in blocks:
+        block_markdown = convert_block_to_markdown(block, image_urls)
+        if indent:
+            for line in block_markdown.splitlines(keepends=True):
+                out.write(f"{indent}{line}" if line.strip() else line)
+        else:
+            out.write(block_markdown)
+
+        # 列表項目的子區塊縮排成巢狀列表，其他區塊（toggle、column 等）的子區塊直接展開
+        if block.get("children"):
+            if block["type"] in LIST_BLOCK_TYPES:
+                write_blocks_markdown(out, block["children"], image_urls, indent + "    ")
+            else:
+                write_blocks_markdown(out, block["children"], image_urls, indent)
+
 
+def convert_block_to_markdown(block, image_urls: dict = None):
+    """將單個 Notion 塊轉換為 markdown，不支援的區塊類型回傳空字串"""
+    renderer = BLOCK_RENDERERS.get(block["type"])
+    if renderer is None:
+        return ""
 
-def convert_block_to_markdown(block):
-    """將單個 Notion 塊轉換為 markdown"""
-    block_type = block["type"]
-    markdown = ""
+    return renderer(block[block["type"]], image_urls or {})
 
-    if block_type == "paragraph":
-        text = extract_rich_text(block["paragraph"]["rich_text"])
-        markdown = f"{text}\n\n"
 
-    elif block_type == "heading_1":
-        text = extract_rich_text(block["heading_1"]["rich_text"])
-        markdown = f"# {text}\n\n"
+def rich_text_renderer(prefix: str, suffix: str):
+    """只包含 rich_text 的區塊：前綴 + 文字 + 後綴"""
+    def render(data, image_urls):
+        return f"{prefix}{extract_rich_text(data['rich_text'])}{suffix}"
 
-    elif block_type == "heading_2":
-        text = extract_rich_text(block["heading_2"]["rich_text"])
-        markdown = f"## {text}\n\n"
+    return render
 
-    elif block_type == "heading_3":
-        text = extract_rich_text(block["heading_3"]["rich_text"])
-        markdown = f"### {text}\n\n"
 
-    elif block_type == "bulleted_list_item":
-        text = extract_rich_text(block["bulleted_list_item"]["rich_text"])
-        markdown = f"- {text}\n"
+def render_code(data, image_urls):
+    language = data["language"] or ""
+    text = extract_rich_text(data["rich_text"])
+    return f"```{language}\n{text}\n```\n\n"
 
-    elif block_type == "numbered_list_item":
-        text = extract_rich_text(block["numbered_list_item"]["rich_text"])
-        markdown = f"1. {text}\n"
 
-    elif block_type == "quote":
-        text = extract_rich_text(block["quote"]["rich_text"])
-        markdown = f"> {text}\n\n"
+def render_image(data, image_urls):
+    # 已上傳到 Medium 的圖片改用 Medium URL
+    image_url = get_image_url(data)
+    image_url = image_urls.get(image_url, image_url)
 
-    elif block_type == "code":
-        language = block["code"]["language"] or ""
-        text = extract_rich_text(block["code"]["rich_text"])
-        markdown = f"```{language}\n{text}\n```\n\n"
+    # 獲取圖片說明文字
+    alt_text = extract_rich_text(data["caption"]) if data.get("caption") else ""
 
-    elif block_type == "divider":
-        markdown = "---\n\n"
+    return f"![{alt_text}]({image_url})\n\n"
 
-    elif block_type == "image":
-        image_data = block["image"]
-        image_url = ""
-        alt_text = ""
 
-        # 處理不同類型的圖片來源
-        if image_data["type"] == "external":
-            image_url = image_data["external"]["url"]
-        elif image_data["type"] == "file":
-            image_url = image_data["file"]["url"]
+def get_image_url(image_data) -> str:
+    """處理不同類型的圖片來源"""
+    if image_data["type"] == "external":
+        return image_data["external"]["url"]
+    elif image_data["type"] == "file":
+        return image_data["file"]["url"]
+    return ""
 
-        # 獲取圖片說明文字
-        if image_data.get("caption"):
-            alt_text = extract_rich_text(image_data["caption"])
 
-        # 標記圖片需要上傳到 Medium
-        markdown = f"![{alt_text}]({image_url})\n\n"
+LIST_BLOCK_TYPES = ("bulleted_list_item", "numbered_list_item")
 
-    return markdown
+# 區塊類型 → 轉換函式
+BLOCK_RENDERERS = {
+    "paragraph": rich_text_renderer("", "\n\n"),
+    "heading_1": rich_text_renderer("# ", "\n\n"),
+    "heading_2": rich_text_renderer("## ", "\n\n"),
+    "heading_3": rich_text_renderer("### ", "\n\n"),
+    "bulleted_list_item": rich_text_renderer("- ", "\n"),
+    "numbered_list_item": rich_text_renderer("1. ", "\n"),
+    "quote": rich_text_renderer("> ", "\n\n"),
+    "code": render_code,
+    "divider": lambda data, image_urls: "---\n\n",
+    "image": render_image,
+}
 
 
 def extract_rich_text(rich_text_array):
@@ -135,33 +290,18 @@ def extract_rich_text(rich_text_array):
     return text
 
 
-def process_images_in_markdown(markdown_content: str) -> str:
-    """處理 markdown 中的圖片，上傳到 Medium 並替換 URL"""
-    import re
-
-    # 找出所有圖片連結的正規表達式
-    image_pattern = r"!\[([^\]]*)\]\(([^)]+)\)"
+def upload_images_to_medium(image_urls: list, max_workers: int = 4) -> dict:
+    """同時上傳多張圖片，回傳 {原始 URL: Medium URL}"""
+    if not image_urls:
+        return {}
 
-    def replace_image(match):
-        alt_text = match.group(1)
-        original_url = match.group(2)
+    print(f"處理圖片: 共 {len(image_urls)} 張")
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return dict(zip(image_urls, executor.map(upload_image_to_medium, image_urls)))
 
-        # 檢查是否為外部 URL（需要上傳到 Medium）
-        if original_url.startswith(("http://", "https://")):
-            print(f"處理圖片: {alt_text or 'untitled'}")
-            medium_url = upload_image_to_medium(original_url)
-            return f"![{alt_text}]({medium_url})"
-        else:
-            # 如果不是外部 URL，保持原樣
-            return match.group(0)
 
-    # 替換所有圖片
-    processed_content = re.sub(image_pattern, replace_image, markdown_content)
-
-    return processed_content
-
-
-def create_post(title: str, content: str, tags):
+def create_post(title: str, content: str, tags) -> str:
+    """以草稿模式發佈文章到 Medium，回傳文章 URL"""
     medium_token = os.getenv("MEDIUM_TOKEN")
     medium_user_id = os.getenv("MEDIUM_USER_ID")
 
@@ -171,8 +311,9 @@ def create_post(title: str, content: str, tags):
         raise ValueError("請設定 MEDIUM_USER_ID 環境變數")
 
     print(content)
-    result = requests.post(
-        f"https://api.medium.com/v1/users/{medium_user_id}/posts",
+    result = medium_request(
+        "POST",
+        f"{MEDIUM_API_URL}/users/{medium_user_id}/posts",
         data=json.dumps(
             {
                 "title": title,
@@ -191,6 +332,10 @@ def create_post(title: str, content: str, tags):
     )
 
     print(result.json())
+    if result.status_code != 201:
+        raise Exception(f"發佈到 Medium 失敗: {result.status_code}, {result.text}")
+
+    return result.json()["data"]["url"]
 
 
 def upload_image_to_medium(image_url: str) -> str:
@@ -199,17 +344,31 @@ def upload_image_to_medium(image_url: str) -> str:
     if not medium_token:
         raise ValueError("請設定 MEDIUM_TOKEN 環境變數")
 
+    cache = get_image_cache()
+
     try:
+        # 固定不變的外部 URL 已上傳過，連下載都不需要
+        cached_url = cache.lookup_url(image_url)
+        if cached_url:
+            print(f"圖片已上傳過（URL 快取）: {cached_url}")
+            return cached_url
+
         # 下載圖片
         print(f"正在下載圖片: {image_url}")
-        image_response = requests.get(image_url)
+        image_response = medium_request("GET", image_url, service="download")
 
         if image_response.status_code != 200:
             print(f"無法下載圖片: {image_url}")
             return image_url  # 回傳原始 URL
 
+        # 內容相同的圖片已上傳過（Notion 檔案 URL 每次都不同，但內容不變）
+        digest = hashlib.sha256(image_response.content).hexdigest()
+        cached_url = cache.lookup_content(digest, image_url)
+        if cached_url:
+            print(f"圖片已上傳過（內容快取）: {cached_url}")
+            return cached_url
+
         # 取得檔名和副檔名
-        import urllib.parse
         from pathlib import Path
 
         parsed_url = urllib.parse.urlparse(image_url)
@@ -232,8 +391,8 @@ def upload_image_to_medium(image_url: str) -> str:
         }
 
         print(f"正在上傳圖片到 Medium: {filename}")
-        result = requests.post(
-            "https://api.medium.com/v1/images", files=files, headers=headers
+        result = medium_request(
+            "POST", f"{MEDIUM_API_URL}/images", files=files, headers=headers
         )
 
         if result.status_code == 201:
@@ -241,6 +400,7 @@ def upload_image_to_medium(image_url: str) -> str:
             medium_url = response_data.get("data", {}).get("url", "")
             if medium_url:
                 print(f"圖片上傳成功: {medium_url}")
+                cache.store(digest, medium_url, len(image_response.content), image_url)
                 return medium_url
 
         print(f"圖片上傳失敗: {result.status_code}, {result.text}")
@@ -252,25 +412,48 @@ def upload_image_to_medium(image_url: str) -> str:
 
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
+    parser = argparse.ArgumentParser(description="將 Notion 頁面發佈到 Medium")
+    parser.add_argument("notion_page_id", nargs="?", help="要發佈的 Notion 頁面 ID")
+    parser.add_argument("--batch", metavar="DATABASE_ID", help="批次發佈資料庫中狀態為 ready 的所有頁面")
+    parser.add_argument("--status-property", default="狀態", help="狀態欄位名稱")
+    parser.add_argument("--ready", default="Ready", help="待發佈的狀態值")
+    parser.add_argument("--published", help="發佈後要更新成的狀態值")
+    parser.add_argument("--url-property", default="Medium URL", help="寫回 Medium 文章 URL 的欄位名稱")
+    parser.add_argument("--workers", type=int, default=3, help="同時處理的頁面數")
+    args = parser.parse_args()
+
+    if not args.notion_page_id and not args.batch:
         print("用法: python post_a_note_to_medium.py <notion_page_id>")
+        print("      python post_a_note_to_medium.py --batch <database_id>")
         sys.exit(1)
 
-    notion_page_id = sys.argv[1]
-
     try:
-        # 從 Notion 獲取頁面內容
-        notion_data = get_notion_page_content(notion_page_id)
+        if args.batch:
+            results = publish_ready_pages(
+                args.batch, args.status_property, args.ready, args.url_property, args.published, args.workers
+            )
+            failed = [page_id for page_id, post_url in results.items() if post_url is None]
+            print(f"批次發佈完成: 成功 {len(results) - len(failed)} 篇, 失敗 {len(failed)} 篇")
+            if failed:
+                sys.exit(1)
+        else:
+            # 從 Notion 獲取頁面內容
+            notion_data = get_notion_page_content(args.notion_page_id)
 
-        print(f"title: {notion_data['title']}")
-        print(f"tags: {notion_data['tags']}")
-        print(f"content preview: {notion_data['content'][:100]}...")
+            print(f"title: {notion_data['title']}")
+            print(f"tags: {notion_data['tags']}")
+            print(f"content preview: {notion_data['content'][:100]}...")
 
-        # 發佈到 Medium
-        create_post(notion_data["title"], notion_data["content"], notion_data["tags"])
+            # 發佈到 Medium
+            create_post(notion_data["title"], notion_data["content"], notion_data["tags"])
 
-        print("create post successfully")
+            print("create post successfully")
 
     except Exception as e:
         print(f"錯誤: {e}")
         sys.exit(1)
+
+    finally:
+        print(request_metrics.summary())
+        if os.getenv("METRICS_PATH"):
+            request_metrics.dump(os.getenv("METRICS_PATH"))
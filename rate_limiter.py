@@ -0,0 +1,124 @@
+import os
+import struct
+import tempfile
+import threading
+import time
+
+# 跨行程共用的限速器以 fcntl 檔案鎖保護狀態檔，不支援的平台改用行程內的 TokenBucket
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# 共用限速器狀態檔的目錄，同一台機器上的所有工作預設共用
+RATE_LIMIT_DIR = os.getenv("RATE_LIMIT_DIR", os.path.join(tempfile.gettempdir(), "cron_jobs_rate_limits"))
+
+# 狀態檔內容：剩餘 token 數與最後更新時間（time.time()，跨行程可比較）
+BUCKET_STATE = struct.Struct("dd")
+
+_shared_limiters = {}
+_shared_limiters_lock = threading.Lock()
+
+
+class TokenBucket:
+    """執行緒安全的 token bucket，限制每秒請求數（允許 capacity 大小的突發）"""
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        # 每秒不到一個請求時容量仍至少為 1，否則永遠湊不滿一個 token
+        self.capacity = max(1.0, capacity or rate)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """取得一個 token，不足時等待補充，回傳實際等待的秒數"""
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+
+                delay = (1 - self.tokens) / self.rate
+
+            time.sleep(delay)
+            waited += delay
+
+
+class SharedTokenBucket:
+    """同一台機器上多個行程共用的 token bucket
+
+    剩餘 token 與更新時間存放在 path 的狀態檔中，每次取 token 時以檔案鎖保護讀寫，
+    同時執行的工作（例如帳本分析與批次發佈）合計不會超過 rate。
+    """
+
+    def __init__(self, path: str, rate: float, capacity: float = None):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.rate = rate
+        # 每秒不到一個請求時容量仍至少為 1，否則永遠湊不滿一個 token
+        self.capacity = max(1.0, capacity or rate)
+        # 檔案鎖只在行程之間互斥，同一行程內的執行緒另外以 threading.Lock 排隊
+        self.lock = threading.Lock()
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o666)
+
+    def close(self):
+        os.close(self.fd)
+
+    def acquire(self) -> float:
+        """取得一個 token，不足時等待補充，回傳實際等待的秒數"""
+        waited = 0.0
+        while True:
+            with self.lock:
+                fcntl.flock(self.fd, fcntl.LOCK_EX)
+                try:
+                    now = time.time()
+                    state = os.pread(self.fd, BUCKET_STATE.size, 0)
+                    if len(state) == BUCKET_STATE.size:
+                        tokens, updated_at = BUCKET_STATE.unpack(state)
+                        # 系統時間往回調時不補充 token
+                        tokens = min(self.capacity, tokens + max(0.0, now - updated_at) * self.rate)
+                    else:
+                        tokens = self.capacity
+
+                    delay = 0.0
+                    if tokens >= 1:
+                        tokens -= 1
+                    else:
+                        delay = (1 - tokens) / self.rate
+                    os.pwrite(self.fd, BUCKET_STATE.pack(tokens, now), 0)
+                finally:
+                    fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+            if delay == 0.0:
+                return waited
+
+            time.sleep(delay)
+            waited += delay
+
+
+def shared_rate_limiter(name: str, default_rate: float):
+    """取得名稱為 name 的共用限速器，速率可用 <NAME>_RATE 環境變數調整（每秒請求數）
+
+    同一行程內重複取得會回傳同一個物件；不支援檔案鎖的平台改用行程內的 TokenBucket。
+    """
+    rate = float(os.getenv(f"{name.upper()}_RATE", default_rate))
+    if rate <= 0:
+        raise ValueError(f"{name.upper()}_RATE 需大於 0: {rate}")
+    with _shared_limiters_lock:
+        limiter = _shared_limiters.get((name, rate))
+        if limiter is None:
+            if fcntl is None:
+                limiter = TokenBucket(rate)
+            else:
+                limiter = SharedTokenBucket(os.path.join(RATE_LIMIT_DIR, f"{name}.bucket"), rate)
+            _shared_limiters[(name, rate)] = limiter
+        return limiter